@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+os.environ.setdefault('CRM_ASYNC_GRAPHQL', '1')
+
+application = get_asgi_application()
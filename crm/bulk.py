@@ -0,0 +1,91 @@
+"""
+Bulk customer import engine used by ``BulkCreateCustomers``.
+
+Rows are validated up front (one chunked ``email__in`` query for
+uniqueness, a precompiled phone pattern) and the valid ones are written
+with chunked ``bulk_create`` inside a single transaction. Errors are still
+reported per row, in input order.
+"""
+
+import re
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Customer
+from .response_cache import invalidate
+
+PHONE_PATTERN = re.compile(r'^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$')
+
+DEFAULT_BATCH_SIZE = getattr(settings, 'CRM_BULK_BATCH_SIZE', 1000)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_emails(emails, batch_size):
+    """Return the subset of ``emails`` already stored, one query per chunk."""
+    found = set()
+    for chunk in chunked(list(emails), batch_size):
+        found.update(Customer.objects.filter(email__in=chunk).values_list('email', flat=True))
+    return found
+
+
+class BulkResult:
+    def __init__(self):
+        self.customers = []
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return float(len(self.customers))
+        return len(self.customers) / self.elapsed
+
+
+def bulk_create_customers(rows, batch_size=None):
+    """Validate and insert customer input rows; return a ``BulkResult``."""
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    result = BulkResult()
+    started = time.perf_counter()
+
+    taken = existing_emails({row.email for row in rows}, batch_size)
+    # (input index, message), so race errors found later sort into place
+    errors = []
+    pending = []
+    for index, row in enumerate(rows):
+        if row.email in taken:
+            errors.append((index, f"Email {row.email} already exists"))
+            continue
+        phone = getattr(row, 'phone', None)
+        if phone and not PHONE_PATTERN.match(phone):
+            errors.append((index, f"Invalid phone format for {row.name}"))
+            continue
+        taken.add(row.email)
+        pending.append((index, Customer(name=row.name, email=row.email, phone=phone or '')))
+
+    with transaction.atomic():
+        for chunk in chunked(pending, batch_size):
+            try:
+                with transaction.atomic():
+                    result.customers.extend(Customer.objects.bulk_create([customer for _, customer in chunk]))
+            except IntegrityError:
+                # A concurrent writer raced us; retry the chunk row by row
+                # so only the conflicting rows are reported.
+                for index, customer in chunk:
+                    try:
+                        with transaction.atomic():
+                            customer.save(force_insert=True)
+                        result.customers.append(customer)
+                    except IntegrityError as e:
+                        errors.append((index, f"Error creating {customer.name}: {str(e)}"))
+    result.errors = [message for _, message in sorted(errors)]
+
+    if result.customers:
+        invalidate(Customer)
+    result.elapsed = time.perf_counter() - started
+    return result
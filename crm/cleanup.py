@@ -0,0 +1,109 @@
+"""
+Batched deletion of inactive customers (no orders, created before a cutoff).
+
+Candidates are walked in primary-key order, ``batch_size`` ids at a time,
+and each batch is deleted by a single ``DELETE ... WHERE id IN (...) AND
+NOT EXISTS (order)`` in its own short transaction, so locks are held for
+one batch only and a customer who places an order mid-purge is kept.
+
+The cascade collector is skipped (``_raw_delete``) while orders, which
+the ``NOT EXISTS`` rules out, and ``CustomerStats``, deleted first in the
+same transaction, are the only rows referencing customers; if another
+model points at ``Customer`` each batch goes through ``QuerySet.delete()``
+instead. Signals do not fire on the fast path, so the response cache is
+invalidated here.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Customer, CustomerStats, Order
+from .response_cache import invalidate
+
+logger = logging.getLogger('crm.cleanup')
+
+BATCH_SIZE = getattr(settings, 'CRM_CLEANUP_BATCH_SIZE', 1000)
+SLEEP = getattr(settings, 'CRM_CLEANUP_SLEEP', 0.1)
+INACTIVE_DAYS = 365
+
+
+def inactive_customers(cutoff):
+    return Customer.objects.filter(created_at__lt=cutoff).filter(
+        ~Exists(Order.objects.filter(customer=OuterRef('pk')))
+    )
+
+
+def can_raw_delete():
+    """Whether a customer delete cascades only to orders and summaries."""
+    return all(
+        relation.related_model in (Order, CustomerStats)
+        for relation in Customer._meta.related_objects
+    )
+
+
+class CleanupResult:
+    def __init__(self):
+        self.deleted = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return float(self.deleted)
+        return self.deleted / self.elapsed
+
+
+def delete_inactive_customers(days=INACTIVE_DAYS, batch_size=BATCH_SIZE, sleep=SLEEP,
+                              dry_run=False, progress=None):
+    """Delete customers without orders created more than ``days`` ago.
+
+    With ``dry_run`` the batches are counted but nothing is deleted.
+    ``progress(result)`` is called after every batch. Returns a
+    ``CleanupResult``.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = inactive_customers(cutoff).order_by('pk').values_list('pk', flat=True)
+    raw = can_raw_delete()
+    using = router.db_for_write(Customer)
+    result = CleanupResult()
+    started = time.perf_counter()
+    last = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last)[:batch_size])
+        if not ids:
+            break
+        last = ids[-1]
+        if dry_run:
+            deleted = len(ids)
+        else:
+            with transaction.atomic(using=using):
+                # Conditions re-checked inside the DELETE itself
+                batch = inactive_customers(cutoff).filter(pk__in=ids)
+                if raw:
+                    CustomerStats.objects.filter(customer__in=batch)._raw_delete(using)
+                    deleted = batch._raw_delete(using)
+                else:
+                    deleted = batch.delete()[1].get(Customer._meta.label, 0)
+        result.deleted += deleted
+        result.batches += 1
+        result.elapsed = time.perf_counter() - started
+        logger.info("Batch %d: %s %d customers (%.0f rows/s)", result.batches,
+                    'would delete' if dry_run else 'deleted', deleted, result.rows_per_second)
+        if progress is not None:
+            progress(result)
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    result.elapsed = time.perf_counter() - started
+    if result.deleted and not dry_run:
+        invalidate(Customer)
+    return result
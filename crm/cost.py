@@ -0,0 +1,237 @@
+"""
+Query cost analysis and depth limits.
+
+Every operation is priced before it executes. An object-typed field costs
+its weight (``FIELD_WEIGHTS``, default 1; scalars are free) times the number
+of items it can return: connections take their page size from
+``first``/``last`` (falling back to ``RELAY_CONNECTION_MAX_LIMIT``) and
+hand it to their ``edges``, plain lists use ``CRM_QUERY_DEFAULT_LIST_SIZE``.
+Connections and lists without ``first``/``last`` nested under another list
+(``orders { products { ... } }``) count ``CRM_QUERY_DEFAULT_NESTED_SIZE``
+rows per parent rather than their full maximum: it prices the typical
+fan-out, not every parent at the maximum page at once.
+The price depends on the variables, so it is computed per request after the
+(cached) validation, not as a validation rule; the depth limit does not and
+is a regular rule.
+
+``CostMiddleware`` counts the same weights as fields actually resolve, so
+responses can report the estimate next to the real cost.
+
+Settings:
+
+- ``CRM_QUERY_MAX_COST``: reject operations estimated above this (None: off).
+- ``CRM_QUERY_MAX_DEPTH``: reject documents nested deeper (None: off).
+- ``CRM_QUERY_DEFAULT_LIST_SIZE``: assumed length of unpaginated lists.
+- ``CRM_QUERY_DEFAULT_NESTED_SIZE``: the same, per parent, under a list.
+- ``CRM_QUERY_COST_WEIGHTS``: ``{'Type.field': weight}`` overrides.
+"""
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode, FragmentSpreadNode, GraphQLError, InlineFragmentNode, ValidationRule,
+    get_named_type, get_nullable_type, get_operation_ast, is_abstract_type, is_list_type,
+    is_object_type, specified_rules,
+)
+from graphql.execution.values import get_argument_values
+
+# Relay plumbing: the rows are counted on ``edges``
+FREE_FIELDS = frozenset(('node', 'pageInfo'))
+
+FIELD_WEIGHTS = {
+    # Aggregates scan whole tables
+    'Query.crmStats': 20,
+    'Query.orderStats': 50,
+    # Ranked full-text search
+    'Query.search': 10,
+}
+FIELD_WEIGHTS.update(getattr(settings, 'CRM_QUERY_COST_WEIGHTS', {}))
+
+MAX_COST = getattr(settings, 'CRM_QUERY_MAX_COST', 10000)
+MAX_DEPTH = getattr(settings, 'CRM_QUERY_MAX_DEPTH', 15)
+DEFAULT_LIST_SIZE = getattr(settings, 'CRM_QUERY_DEFAULT_LIST_SIZE', 100)
+DEFAULT_NESTED_SIZE = getattr(settings, 'CRM_QUERY_DEFAULT_NESTED_SIZE', 10)
+
+
+class QueryCostError(GraphQLError):
+    pass
+
+
+def is_composite(graphql_type):
+    named = get_named_type(graphql_type)
+    return is_object_type(named) or is_abstract_type(named)
+
+
+def field_weight(parent_name, field_name, graphql_type):
+    """Weight of resolving one instance of ``parent_name.field_name``."""
+    key = f'{parent_name}.{field_name}'
+    if key in FIELD_WEIGHTS:
+        return FIELD_WEIGHTS[key]
+    if field_name.startswith('__') or field_name in FREE_FIELDS or not is_composite(graphql_type):
+        return 0
+    return 1
+
+
+def page_size(field_def, field_node, variables):
+    if 'first' not in field_def.args and 'last' not in field_def.args:
+        return None
+    try:
+        args = get_argument_values(field_def, field_node, variables)
+    except GraphQLError:
+        # Execution reports the bad argument
+        return None
+    sizes = [args[name] for name in ('first', 'last') if args.get(name) is not None]
+    return min(sizes) if sizes else None
+
+
+class CostEstimator:
+    def __init__(self, schema, fragments, variables, default_list_size=DEFAULT_LIST_SIZE,
+                 default_nested_size=DEFAULT_NESTED_SIZE):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.default_list_size = default_list_size
+        self.default_nested_size = default_nested_size
+        self.max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or default_list_size
+
+    def selection_cost(self, parent_type, selection_set, edges_size=None, in_list=False):
+        total = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                total += self.field_cost(parent_type, selection, edges_size, in_list)
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+            else:
+                fragment = selection
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+            # Sums every member of a union: an upper bound
+            total += self.selection_cost(fragment_type, fragment.selection_set, edges_size, in_list)
+        return total
+
+    def field_cost(self, parent_type, field_node, edges_size=None, in_list=False):
+        name = field_node.name.value
+        field_def = getattr(parent_type, 'fields', {}).get(name)
+        if field_def is None:
+            return 0
+        weight = field_weight(parent_type.name, name, field_def.type)
+        if not is_composite(field_def.type):
+            return weight
+
+        size = page_size(field_def, field_node, self.variables)
+        unpaginated = self.default_nested_size if in_list else None
+        if is_list_type(get_nullable_type(field_def.type)):
+            count = edges_size or size or unpaginated or self.default_list_size
+            child_edges_size = None
+        else:
+            count = 1
+            paginated = 'first' in field_def.args or 'last' in field_def.args
+            child_edges_size = (size or unpaginated or self.max_limit) if paginated else None
+
+        children = 0
+        if field_node.selection_set is not None:
+            children = self.selection_cost(
+                get_named_type(field_def.type), field_node.selection_set, child_edges_size,
+                in_list or count > 1,
+            )
+        return count * (weight + children)
+
+
+def estimate_cost(schema, document, operation_name=None, variables=None):
+    """Worst-case cost of ``operation_name`` in ``document`` with ``variables``."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    root_type = schema.get_root_type(operation.operation)
+    if root_type is None:
+        return 0
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if hasattr(definition, 'type_condition') and hasattr(definition, 'name')
+    }
+    return CostEstimator(schema, fragments, variables).selection_cost(
+        root_type, operation.selection_set
+    )
+
+
+def check_cost(schema, document, operation_name=None, variables=None, max_cost=MAX_COST):
+    """Return the estimated cost; raise ``QueryCostError`` over ``max_cost``."""
+    cost = estimate_cost(schema, document, operation_name, variables)
+    if max_cost is not None and cost > max_cost:
+        raise QueryCostError(
+            f"Query cost {cost} exceeds the maximum of {max_cost}",
+            extensions={'code': 'QUERY_TOO_COMPLEX', 'cost': cost, 'maximum': max_cost},
+        )
+    return cost
+
+
+class CostMiddleware:
+    """Accumulate the real cost of an execution on ``info.context.crm_cost``."""
+
+    def __init__(self):
+        self.weights = {}
+
+    def weight(self, info):
+        key = (info.parent_type.name, info.field_name)
+        if key not in self.weights:
+            return_type = info.return_type
+            weight = field_weight(info.parent_type.name, info.field_name, return_type)
+            self.weights[key] = (weight, is_list_type(get_nullable_type(return_type)))
+        return self.weights[key]
+
+    def resolve(self, next, root, info, **args):
+        result = next(root, info, **args)
+        weight, is_list = self.weight(info)
+        if weight and result is not None:
+            # QuerySets are evaluated here and reuse their result cache below
+            count = len(result) if is_list and hasattr(result, '__len__') else 1
+            info.context.crm_cost = getattr(info.context, 'crm_cost', 0) + weight * count
+        return result
+
+
+def depth_limit_rule(max_depth):
+    """Build a validation rule rejecting operations nested over ``max_depth``."""
+
+    class DepthLimitRule(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            depth = self.depth(node.selection_set, 0, set())
+            if depth > max_depth:
+                self.report_error(GraphQLError(
+                    f"Query depth {depth} exceeds the maximum of {max_depth}",
+                    node,
+                    extensions={'code': 'QUERY_TOO_DEEP'},
+                ))
+
+        def depth(self, selection_set, depth, visited):
+            if selection_set is None:
+                return depth
+            deepest = depth
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    if selection.name.value.startswith('__'):
+                        # Introspection (GraphiQL) is nested but cheap
+                        continue
+                    deepest = max(deepest, self.depth(selection.selection_set, depth + 1, visited))
+                elif isinstance(selection, InlineFragmentNode):
+                    deepest = max(deepest, self.depth(selection.selection_set, depth, visited))
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    if fragment is None or name in visited:
+                        continue
+                    deepest = max(deepest, self.depth(fragment.selection_set, depth, visited | {name}))
+            return deepest
+
+    return DepthLimitRule
+
+
+def validation_rules(max_depth=MAX_DEPTH):
+    """The standard rules plus the depth limit, for ``GraphQLView.validation_rules``."""
+    if max_depth is None:
+        return None
+    return (*specified_rules, depth_limit_rule(max_depth))
@@ -1,56 +1,64 @@
-import requests
 import datetime
 import json
 
+from django.conf import settings
+
+from .jobs import run_query
+
+LOG_PRODUCTS = getattr(settings, 'CRM_LOW_STOCK_LOG_PRODUCTS', False)
+
+def log_crm_heartbeat():
+    timestamp = datetime.datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
+    message = f"{timestamp} CRM is alive"
+    try:
+        # Confirms the schema (and database settings) load, not just cron
+        data = run_query("{ hello }")
+        message += f" - GraphQL: {data['hello']}"
+    except Exception as e:
+        message += f" - GraphQL check failed: {e}"
+
+    with open('/tmp/crm_heartbeat_log.txt', 'a') as log_file:
+        log_file.write(message + '\n')
+
 def update_low_stock():
-    graphql_endpoint = 'http://localhost:8000/graphql/'  # Adjust if your GraphQL endpoint is different
+    # The products are only fetched when they are logged
     query = """
-        mutation {
+        mutation UpdateLowStock($logProducts: Boolean!) {
             updateLowStockProducts {
                 success
                 message
-                updatedProducts {
-                    id
+                updatedCount
+                updatedProducts @include(if: $logProducts) {
                     name
                     stock
                 }
             }
         }
     """
-    headers = {'Content-Type': 'application/json'}
+    log_file_path = '/tmp/low_stock_updates_log.txt'
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     try:
-        response = requests.post(graphql_endpoint, headers=headers, json={'query': query})
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        data = response.json()
-
-        log_file_path = '/tmp/low_stock_updates_log.txt'
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        data = run_query(query, {'logProducts': LOG_PRODUCTS})
 
         with open(log_file_path, 'a') as log_file:
             log_file.write(f"--- Logged on: {timestamp} ---\n")
-            if data and 'data' in data and 'updateLowStockProducts' in data['data']:
-                mutation_result = data['data']['updateLowStockProducts']
+            if data and 'updateLowStockProducts' in data:
+                mutation_result = data['updateLowStockProducts']
                 log_file.write(f"Success: {mutation_result['success']}\n")
                 log_file.write(f"Message: {mutation_result['message']}\n")
 
-                if mutation_result['updatedProducts']:
+                if not mutation_result['updatedCount']:
+                    log_file.write("No products updated.\n")
+                elif LOG_PRODUCTS:
                     log_file.write("Updated Products:\n")
                     for product in mutation_result['updatedProducts']:
                         log_file.write(f"  - Name: {product['name']}, New Stock: {product['stock']}\n")
-                else:
-                    log_file.write("No products updated.\n")
             else:
                 log_file.write(f"Error or unexpected response from GraphQL: {json.dumps(data)}\n")
             log_file.write("\n")
 
-    except requests.exceptions.RequestException as e:
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            log_file.write(f"--- Logged on: {timestamp} ---\n")
-            log_file.write(f"Network or GraphQL request error: {e}\n\n")
     except Exception as e:
-        with open('/tmp/low_stock_updates_log.txt', 'a') as log_file:
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with open(log_file_path, 'a') as log_file:
             log_file.write(f"--- Logged on: {timestamp} ---\n")
-            log_file.write(f"An unexpected error occurred: {e}\n\n")
\ No newline at end of file
+            log_file.write(f"An unexpected error occurred: {e}\n\n")
@@ -5,21 +5,9 @@ PROJECT_DIR="$(cd "$SCRIPT_DIR/../.." && pwd)"
 
 if [ -f "$PROJECT_DIR/manage.py" ]; then
     cd "$PROJECT_DIR"
-    cwd=$(pwd)
-    
-    deleted_count=$(python manage.py shell -c "
-from django.utils import timezone
-from datetime import timedelta
-from crm.models import Customer
-
-one_year_ago = timezone.now() - timedelta(days=365)
-inactive_customers = Customer.objects.filter(orders__isnull=True).filter(created_at__lt=one_year_ago)
-count = inactive_customers.count()
-inactive_customers.delete()
-print(count)
-")
-    
-    echo "$(date): Deleted $deleted_count inactive customers" >> /tmp/customer_cleanup_log.txt
+    # Batched delete; see crm/cleanup.py
+    result=$(python manage.py clean_inactive_customers 2>&1)
+    echo "$(date): $result" >> /tmp/customer_cleanup_log.txt
 else
     echo "$(date): Error - manage.py not found in $PROJECT_DIR" >> /tmp/customer_cleanup_log.txt
 fi
@@ -1,50 +1,34 @@
 #!/usr/bin/env python3
 
-from datetime import datetime, timedelta
+import os
+import sys
+from datetime import datetime
 
-try:
-    from gql import gql, Client
-    from gql.transport.requests import RequestsHTTPTransport
-    GQL_AVAILABLE = True
-except ImportError:
-    GQL_AVAILABLE = False
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def setup_django():
+    # Run by cron as a plain script: load the project to query it in-process
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crm.settings')
+    import django
+    django.setup()
 
 def send_order_reminders():
-    if not GQL_AVAILABLE:
-        print("GQL library not available")
-        return
-        
-    query = gql("""
-    query GetPendingOrders($orderDateGte: Date) {
-        orders(orderDateGte: $orderDateGte) {
-            id
-            customer {
-                email
-            }
-            orderDate
-        }
-    }
-    """)
-    
+    # Pending orders, claims and send throttling: see crm/reminders.py
+    from crm.reminders import LOG_FILE, dispatch_reminders
+
     try:
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport)
-        
-        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        result = client.execute(query, variable_values={"orderDateGte": seven_days_ago})
-        
-        orders = result.get('orders', [])
-        
-        with open('/tmp/order_reminders_log.txt', 'a') as log_file:
+        result = dispatch_reminders()
+        with open(LOG_FILE, 'a') as log_file:
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            for order in orders:
-                log_entry = f"{timestamp}: Order ID {order['id']}, Customer Email: {order['customer']['email']}\n"
-                log_file.write(log_entry)
-        
-        print("Order reminders processed!")
-            
+            log_file.write(f"{timestamp}: Reminder run: {result}\n")
+
+        print(f"Order reminders processed! {result}")
+
     except Exception as e:
         print(f"Error processing order reminders: {e}")
 
 if __name__ == "__main__":
+    setup_django()
     send_order_reminders()
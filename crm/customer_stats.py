@@ -0,0 +1,128 @@
+"""
+Per-customer order summaries (``CustomerStats``).
+
+``record_orders`` adds new orders to their customers' rows inside the
+transaction that places them (``place_orders``), and ``forget_order``
+takes a deleted order back out (``post_delete``). Both are single
+``UPDATE`` statements built from ``F()`` expressions, so concurrent
+writers never overwrite each other's counts. Orders written any other way
+(``generate_data``, raw SQL, edits of ``total_amount``) are only picked up
+by ``rebuild_customer_stats`` / ``manage.py rebuild_customer_stats``.
+
+The summaries are exposed as ``CustomerType.orderCount``,
+``lifetimeValue`` and ``lastOrderDate`` and are filterable and sortable
+through ``CustomerFilter``.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, CustomerStats, Order
+from .response_cache import invalidate
+
+CHUNK_SIZE = getattr(settings, 'CRM_CUSTOMER_STATS_CHUNK_SIZE', 5000)
+
+def record_orders(orders):
+    """Add freshly created ``orders`` to their customers' summaries."""
+    deltas = {}
+    for order in orders:
+        count, total, last = deltas.get(order.customer_id, (0, 0, None))
+        deltas[order.customer_id] = (
+            count + 1,
+            total + order.total_amount,
+            order.order_date if last is None else max(last, order.order_date),
+        )
+    if not deltas:
+        return
+
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(customer_id=customer_id) for customer_id in deltas], ignore_conflicts=True
+    )
+    CustomerStats.objects.filter(pk__in=list(deltas)).update(
+        order_count=Case(
+            *[When(pk=pk, then=F('order_count') + count) for pk, (count, _, _) in deltas.items()],
+            default=F('order_count'),
+        ),
+        lifetime_value=Case(
+            *[When(pk=pk, then=F('lifetime_value') + Value(total, output_field=DecimalField()))
+              for pk, (_, total, _) in deltas.items()],
+            default=F('lifetime_value'),
+        ),
+        last_order_date=Case(
+            *[When(pk=pk, then=Greatest(Coalesce('last_order_date', Value(last)), Value(last)))
+              for pk, (_, _, last) in deltas.items()],
+            default=F('last_order_date'),
+        ),
+    )
+    # Summaries read as customer fields
+    invalidate(Customer)
+
+
+def forget_order(order):
+    """Take a deleted ``order`` back out of its customer's summary."""
+    stats = CustomerStats.objects.filter(pk=order.customer_id)
+    if not stats.update(
+        order_count=F('order_count') - 1,
+        lifetime_value=F('lifetime_value') - Value(order.total_amount, output_field=DecimalField()),
+    ):
+        return
+    # Only the latest order moves last_order_date
+    stats.filter(last_order_date__lte=order.order_date).update(
+        last_order_date=Subquery(
+            Order.objects.filter(customer_id=OuterRef('pk'))
+            .order_by('-order_date')
+            .values('order_date')[:1]
+        )
+    )
+    invalidate(Customer)
+
+
+def rebuild_chunk(lower, upper):
+    """Recompute the summaries of customers with ids in ``[lower, upper]``."""
+    with transaction.atomic():
+        # Orders placed meanwhile wait for these rows, then add on top
+        existing = list(CustomerStats.objects.select_for_update().filter(pk__gte=lower, pk__lte=upper))
+        totals = {
+            total['customer_id']: total
+            for total in Order.objects.order_by()
+            .filter(customer_id__gte=lower, customer_id__lte=upper)
+            .values('customer_id')
+            .annotate(order_count=Count('id'), lifetime_value=Sum('total_amount'),
+                      last_order_date=Max('order_date'))
+        }
+        empty = {'order_count': 0, 'lifetime_value': 0, 'last_order_date': None}
+        for row in existing:
+            total = totals.pop(row.pk, empty)
+            row.order_count = total['order_count']
+            row.lifetime_value = total['lifetime_value']
+            row.last_order_date = total['last_order_date']
+        CustomerStats.objects.bulk_update(existing, ['order_count', 'lifetime_value', 'last_order_date'])
+        CustomerStats.objects.bulk_create([
+            CustomerStats(customer_id=customer_id, order_count=total['order_count'],
+                          lifetime_value=total['lifetime_value'], last_order_date=total['last_order_date'])
+            for customer_id, total in totals.items()
+        ], ignore_conflicts=True)
+        invalidate(Customer)
+    return len(existing) + len(totals)
+
+
+def rebuild_customer_stats(chunk_size=CHUNK_SIZE, start=0, progress=None):
+    """Recompute every summary from ``Order``, ``chunk_size`` customers per transaction.
+
+    ``progress(last_customer_id, rows)`` is called after each chunk.
+    Returns the number of summaries written.
+    """
+    written = 0
+    last = start
+    while True:
+        ids = list(
+            Customer.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return written
+        written += rebuild_chunk(ids[0], ids[-1])
+        last = ids[-1]
+        if progress is not None:
+            progress(last, written)
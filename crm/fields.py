@@ -0,0 +1,46 @@
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.filter.fields import convert_enum
+
+from .loaders import get_loaders
+from .optimizer import PAGINATION_ARGS, optimize_queryset
+
+
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """Filter connection field that accepts loader lists and primes its nodes."""
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        # Lists come from a batch loader and are already scoped to the parent
+        if isinstance(iterable, list):
+            return iterable
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        get_loaders(info).prime(edge.node for edge in result.edges)
+        return result
+
+
+def has_filter_args(args):
+    """True when a connection was called with filtering arguments."""
+    return any(value is not None for key, value in args.items() if key not in PAGINATION_ARGS)
+
+
+def filter_data(field, args):
+    """The filterset ``data`` graphene-django builds from ``field``'s ``args``."""
+    data = {}
+    for key, value in args.items():
+        if key in field.filtering_args:
+            if key == 'order_by' and value is not None:
+                value = to_snake_case(value)
+            data[key] = convert_enum(value)
+    return data
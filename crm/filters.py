@@ -1,16 +1,79 @@
+from decimal import Decimal
+
 import django_filters
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django_filters.constants import EMPTY_VALUES
 from .models import Customer, Product, Order
 
+# Summaries of customers without a CustomerStats row (no orders yet)
+STATS_DEFAULTS = {
+    'stats__order_count': 0,
+    'stats__lifetime_value': Decimal('0'),
+}
+
+def stats_expression(field_name):
+    """``field_name``, read as its zero value when the summary row is missing."""
+    if field_name in STATS_DEFAULTS:
+        return Coalesce(F(field_name), Value(STATS_DEFAULTS[field_name]))
+    return F(field_name)
+
+class StatsNumberFilter(django_filters.NumberFilter):
+    """Range filter on a summary where customers without a row count as 0."""
+    
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        alias = self.field_name.replace('__', '_')
+        return qs.alias(**{alias: stats_expression(self.field_name)}).filter(
+            **{f'{alias}__{self.lookup_expr}': value}
+        )
+
+class NullsLastOrderingFilter(django_filters.OrderingFilter):
+    """Ordering where customers without a summary count as 0 orders/value and
+    missing dates sort as lowest."""
+    
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            # Ties broken by id keep offset pages stable
+            qs = qs.order_by(*qs.query.order_by, 'pk')
+        return qs
+    
+    def get_ordering_value(self, param):
+        value = super().get_ordering_value(param)
+        if value.startswith('-'):
+            return stats_expression(value[1:]).desc(nulls_last=True)
+        return stats_expression(value).asc(nulls_first=True)
+
 class CustomerFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
     email = django_filters.CharFilter(lookup_expr='icontains')
     created_at__gte = django_filters.DateFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(field_name='phone', lookup_expr='startswith')
+    # Order summaries (CustomerStats)
+    order_count__gte = StatsNumberFilter(field_name='stats__order_count', lookup_expr='gte')
+    order_count__lte = StatsNumberFilter(field_name='stats__order_count', lookup_expr='lte')
+    lifetime_value__gte = StatsNumberFilter(field_name='stats__lifetime_value', lookup_expr='gte')
+    lifetime_value__lte = StatsNumberFilter(field_name='stats__lifetime_value', lookup_expr='lte')
+    last_order_date__gte = django_filters.DateFilter(field_name='stats__last_order_date', lookup_expr='gte')
+    last_order_date__lte = django_filters.DateFilter(field_name='stats__last_order_date', lookup_expr='lte')
+    order_by = NullsLastOrderingFilter(fields=(
+        ('name', 'name'),
+        ('created_at', 'created_at'),
+        ('stats__order_count', 'order_count'),
+        ('stats__lifetime_value', 'lifetime_value'),
+        ('stats__last_order_date', 'last_order_date'),
+    ))
     
     class Meta:
         model = Customer
-        fields = ['name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern']
+        fields = [
+            'name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern',
+            'order_count__gte', 'order_count__lte', 'lifetime_value__gte', 'lifetime_value__lte',
+            'last_order_date__gte', 'last_order_date__lte',
+        ]
 
 class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
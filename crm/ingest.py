@@ -0,0 +1,270 @@
+"""
+Write-behind ingestion for ``createCustomer``/``createOrder``.
+
+With ``CRM_INGESTION`` set, the mutations validate their input without
+touching the database, put it on ``ingestion_queue`` and return a job id
+(poll it with the ``ingestionStatus`` query). A flusher thread coalesces
+queued payloads into micro-batches of up to ``CRM_INGESTION_BATCH_SIZE``,
+waiting at most ``CRM_INGESTION_MAX_WAIT`` seconds, and either commits each
+batch itself (``'thread'``) or hands it to the ``crm.tasks.ingest_batch``
+Celery task (``'celery'``).
+
+A batch is one transaction: customers need one ``email__in`` query and one
+``bulk_create``, orders go through ``place_orders``. Job statuses live in
+the ``CRM_INGESTION_CACHE_ALIAS`` cache for ``CRM_INGESTION_STATUS_TTL``
+seconds. That cache must be shared by every web and Celery worker
+(``CRM_CACHE_URL``): a per-process memory cache is refused, since a poll
+landing on another worker would report the job as unknown.
+
+Payloads still buffered when the process dies are lost: that window (at
+most ``CRM_INGESTION_MAX_WAIT``) is the price of write-behind. Leave
+``CRM_INGESTION`` unset for synchronous writes.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .bulk import PHONE_PATTERN, existing_emails
+from .models import Customer, Product
+from .orders import merge_lines, place_orders, to_pk
+from .response_cache import invalidate
+
+logger = logging.getLogger('crm.ingest')
+
+MODE = getattr(settings, 'CRM_INGESTION', None)
+BATCH_SIZE = getattr(settings, 'CRM_INGESTION_BATCH_SIZE', 500)
+MAX_WAIT = getattr(settings, 'CRM_INGESTION_MAX_WAIT', 0.05)
+QUEUE_SIZE = getattr(settings, 'CRM_INGESTION_QUEUE_SIZE', 100000)
+CACHE_ALIAS = getattr(settings, 'CRM_INGESTION_CACHE_ALIAS', 'default')
+STATUS_TTL = getattr(settings, 'CRM_INGESTION_STATUS_TTL', 3600)
+
+QUEUED, DONE, FAILED = 'queued', 'done', 'failed'
+
+
+def status_key(job_id):
+    return f'crm:ingest:{job_id}'
+
+
+def get_status(job_id):
+    """``{'job_id', 'kind', 'status', 'object_id', 'error'}`` or None once expired."""
+    return caches[CACHE_ALIAS].get(status_key(job_id))
+
+
+def set_statuses(statuses):
+    caches[CACHE_ALIAS].set_many(
+        {status_key(status['job_id']): status for status in statuses}, STATUS_TTL
+    )
+
+
+def job_status(payload, status, object_id=None, error=None):
+    return {
+        'job_id': payload['job_id'],
+        'kind': payload['kind'],
+        'status': status,
+        'object_id': object_id,
+        'error': error,
+    }
+
+
+def customer_payload(name, email, phone=None):
+    """Validate a customer without queries; uniqueness is checked per batch."""
+    if not name:
+        raise ValidationError("Name is required")
+    validate_email(email)
+    if phone and not PHONE_PATTERN.match(phone):
+        raise ValidationError("Invalid phone format")
+    return {'kind': 'customer', 'name': name, 'email': email, 'phone': phone or ''}
+
+
+def order_payload(customer_id, lines, order_date=None):
+    """Validate an order without queries; ids and stock are checked per batch."""
+    quantities = merge_lines(lines)
+    if not quantities:
+        raise ValidationError("At least one product must be selected")
+    if to_pk(Customer, customer_id) is None:
+        raise ValidationError("Invalid customer ID")
+    if any(to_pk(Product, product_id) is None for product_id in quantities):
+        raise ValidationError("Invalid product ID")
+    return {
+        'kind': 'order',
+        'customer_id': str(customer_id),
+        'lines': list(quantities.items()),
+        'order_date': order_date.isoformat() if order_date else None,
+    }
+
+
+def ingest_customers(payloads):
+    statuses = []
+    taken = existing_emails({payload['email'] for payload in payloads}, BATCH_SIZE)
+    pending = []
+    for payload in payloads:
+        if payload['email'] in taken:
+            statuses.append(job_status(payload, FAILED, error="Email already exists"))
+            continue
+        taken.add(payload['email'])
+        pending.append((payload, Customer(name=payload['name'], email=payload['email'],
+                                          phone=payload['phone'])))
+    try:
+        with transaction.atomic():
+            Customer.objects.bulk_create([customer for _, customer in pending])
+    except IntegrityError:
+        # A synchronous writer took an email meanwhile; retry row by row
+        for payload, customer in pending:
+            try:
+                with transaction.atomic():
+                    customer.save(force_insert=True)
+            except IntegrityError:
+                customer.pk = None
+                statuses.append(job_status(payload, FAILED, error="Email already exists"))
+    for payload, customer in pending:
+        if customer.pk is not None:
+            statuses.append(job_status(payload, DONE, object_id=customer.pk))
+    return statuses
+
+
+def ingest_orders(payloads):
+    results = place_orders([
+        (payload['customer_id'], payload['lines'], payload['order_date']) for payload in payloads
+    ])
+    return [
+        job_status(payload, FAILED, error=' '.join(result.messages))
+        if isinstance(result, ValidationError)
+        else job_status(payload, DONE, object_id=result.pk)
+        for payload, result in zip(payloads, results)
+    ]
+
+
+def process_batch(payloads):
+    """Commit queued payloads in one transaction and record their statuses."""
+    try:
+        with transaction.atomic():
+            statuses = ingest_customers([p for p in payloads if p['kind'] == 'customer'])
+            statuses += ingest_orders([p for p in payloads if p['kind'] == 'order'])
+            if any(s['kind'] == 'customer' and s['status'] == DONE for s in statuses):
+                invalidate(Customer)
+    except Exception as e:
+        logger.exception("Ingestion batch of %d failed", len(payloads))
+        statuses = [job_status(payload, FAILED, error=str(e)) for payload in payloads]
+    set_statuses(statuses)
+    return statuses
+
+
+class IngestionQueue:
+    """Bounded in-process buffer drained in micro-batches by a daemon thread."""
+
+    def __init__(self, handler, batch_size=BATCH_SIZE, max_wait=MAX_WAIT, max_size=QUEUE_SIZE):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, payload):
+        """Queue a validated payload and return its job id."""
+        payload = dict(payload, job_id=uuid.uuid4().hex)
+        set_statuses([job_status(payload, QUEUED)])
+        self.start()
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            caches[CACHE_ALIAS].delete(status_key(payload['job_id']))
+            raise ValidationError("Ingestion queue is full, retry later")
+        return payload['job_id']
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='crm-ingest', daemon=True)
+                self.thread.start()
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.handler(batch)
+                self.batches += 1
+                self.items += len(batch)
+            except Exception as e:
+                logger.exception("Ingestion handler failed for %d payloads", len(batch))
+                set_statuses([job_status(payload, FAILED, error=str(e)) for payload in batch])
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        """Block until everything queued so far has been handled."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'batches': self.batches,
+            'items': self.items,
+        }
+
+
+def send_to_celery(payloads):
+    from .tasks import ingest_batch
+
+    ingest_batch.delay(payloads)
+
+
+HANDLERS = {
+    'thread': process_batch,
+    'celery': send_to_celery,
+}
+
+
+# Caches private to one process: a status poll served by another web
+# worker (or a Celery worker's update) would never see the job
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def build_ingestion_queue():
+    if not MODE:
+        return None
+    if MODE not in HANDLERS:
+        raise ImproperlyConfigured(f"CRM_INGESTION must be one of {sorted(HANDLERS)} or unset")
+    if isinstance(caches[CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            f"CRM_INGESTION needs a cache shared by every process for job statuses; "
+            f"cache {CACHE_ALIAS!r} is process-local (set CRM_CACHE_URL)"
+        )
+    ingestion_queue = IngestionQueue(HANDLERS[MODE])
+    atexit.register(ingestion_queue.flush)
+    return ingestion_queue
+
+
+ingestion_queue = build_ingestion_queue()
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product
+from .response_cache import invalidate
+
+LOW_STOCK_THRESHOLD = 10
+RESTOCK_AMOUNT = 10
+
+
+def restock_low_stock(queryset=None, threshold=LOW_STOCK_THRESHOLD, increment=RESTOCK_AMOUNT):
+    """Add ``increment`` to every product below ``threshold`` in one UPDATE.
+
+    Returns the ids of the restocked products. The ids are read under
+    ``select_for_update`` and the UPDATE targets exactly those ids, so
+    rows that drop below ``threshold`` in between are left for the next run.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    candidates = queryset.filter(stock__lt=threshold)
+    with transaction.atomic():
+        ids = list(candidates.select_for_update().values_list('pk', flat=True))
+        if ids:
+            Product.objects.filter(pk__in=ids).update(stock=F('stock') + increment)
+            invalidate(Product)
+    return ids
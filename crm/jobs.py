@@ -0,0 +1,92 @@
+"""
+GraphQL for scheduled jobs (django-crontab, Celery, the reminder script).
+
+``run_query`` executes against ``schema.schema`` in the calling process:
+no serialisation round trip, no web worker tied up, and no dependency on
+the web server being up. Documents go through the shared
+``document_cache`` and mutations run in a transaction, as they would over
+HTTP.
+
+Hosts whose job runner cannot reach the database can set
+``CRM_JOB_TRANSPORT = 'http'`` to POST to ``CRM_JOB_GRAPHQL_URL`` instead.
+Either way the result is the response's ``data`` (JSON-compatible values),
+and GraphQL errors raise ``JobQueryError``.
+"""
+
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from graphql import OperationType, execute, get_operation_ast
+
+from .loaders import clear_loaders
+from .persisted import document_cache
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+TRANSPORT = getattr(settings, 'CRM_JOB_TRANSPORT', 'local')
+GRAPHQL_URL = getattr(settings, 'CRM_JOB_GRAPHQL_URL', 'http://localhost:8000/graphql')
+HTTP_TIMEOUT = getattr(settings, 'CRM_JOB_HTTP_TIMEOUT', 30)
+
+
+class JobQueryError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(str(error.get('message', error)) if isinstance(error, dict)
+                                   else str(error) for error in errors))
+
+
+def run_local(query, variables=None, operation_name=None):
+    from schema import schema
+
+    document, errors = document_cache.get_document(schema.graphql_schema, query)
+    if errors:
+        raise JobQueryError(errors)
+    operation = get_operation_ast(document, operation_name)
+    # Per-run loaders and stats live on the context, as on a request
+    context = SimpleNamespace(crm_cost=0)
+    options = {
+        'context_value': context,
+        'variable_values': variables,
+        'operation_name': operation_name,
+    }
+    if operation is not None and operation.operation == OperationType.MUTATION:
+        with transaction.atomic():
+            result = execute(schema.graphql_schema, document, **options)
+            if result.errors:
+                transaction.set_rollback(True)
+        clear_loaders(context)
+    else:
+        result = execute(schema.graphql_schema, document, **options)
+    if result.errors:
+        raise JobQueryError(result.errors)
+    return result.data
+
+
+def run_http(query, variables=None, operation_name=None):
+    if requests is None:
+        raise RuntimeError("CRM_JOB_TRANSPORT = 'http' requires the requests package")
+    response = requests.post(
+        GRAPHQL_URL,
+        json={'query': query, 'variables': variables, 'operationName': operation_name},
+        timeout=HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get('errors'):
+        raise JobQueryError(body['errors'])
+    return body['data']
+
+
+TRANSPORTS = {
+    'local': run_local,
+    'http': run_http,
+}
+
+
+def run_query(query, variables=None, operation_name=None, transport=None):
+    """Execute ``query`` for a job and return its ``data``."""
+    return TRANSPORTS[transport or TRANSPORT](query, variables, operation_name)
@@ -0,0 +1,228 @@
+"""
+Per-request batch loaders for the CRM GraphQL types.
+
+Graphene executes our schema synchronously and depth-first, so a resolver
+for ``Order.customer`` cannot wait for its siblings the way an async
+DataLoader would. Instead, every list/connection resolver *primes* the
+loaders with the keys of the objects it returns, and the first ``load()``
+on a loader fetches all pending keys with a single ``IN (...)`` query.
+Objects returned by a batch prime the next level in turn, so each level of
+a nested selection costs one query regardless of result size.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db.models import F
+
+from .models import Customer, CustomerStats, Order, OrderItem, Product
+
+
+class BatchLoader:
+    """Caches values by key and fetches pending keys in one batch."""
+
+    default = None
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self.cache = {}
+        self.pending = set()
+
+    def prime(self, key):
+        if key is not None and key not in self.cache:
+            self.pending.add(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            keys = self.pending | {key}
+            self.pending = set()
+            results = self.batch_load(keys)
+            for k in keys:
+                self.cache[k] = results.get(k, self.default_value())
+        return self.cache[key]
+
+    def default_value(self):
+        return self.default
+
+    def batch_load(self, keys):
+        raise NotImplementedError
+
+
+class ListBatchLoader(BatchLoader):
+    def default_value(self):
+        return []
+
+
+class CustomerLoader(BatchLoader):
+    """Customer by customer id (``Order.customer``)."""
+
+    def batch_load(self, keys):
+        customers = list(Customer.objects.filter(id__in=keys))
+        self.loaders.prime(customers)
+        return {customer.id: customer for customer in customers}
+
+
+class CustomerStatsLoader(BatchLoader):
+    """Order summary by customer id (``Customer.orderCount`` etc.)."""
+
+    def batch_load(self, keys):
+        return CustomerStats.objects.in_bulk(keys)
+
+
+class CustomerOrdersLoader(ListBatchLoader):
+    """Orders by customer id (``Customer.orders``)."""
+
+    def batch_load(self, keys):
+        orders = list(Order.objects.filter(customer_id__in=keys).order_by('id'))
+        self.loaders.prime(orders)
+        results = defaultdict(list)
+        for order in orders:
+            results[order.customer_id].append(order)
+        return results
+
+
+class OrderProductsLoader(ListBatchLoader):
+    """Products by order id (``Order.products``)."""
+
+    def batch_load(self, keys):
+        items = list(
+            OrderItem.objects.filter(order_id__in=keys)
+            .select_related('product')
+            .order_by('id')
+        )
+        self.loaders.prime(item.product for item in items)
+        results = defaultdict(list)
+        for item in items:
+            results[item.order_id].append(item.product)
+        return results
+
+
+class FilteredOrderProductsLoader(ListBatchLoader):
+    """Products by order id, through a filterset (``Order.products(name: ...)``).
+
+    One loader per distinct set of filter arguments, so sibling orders
+    queried with the same arguments share one query.
+    """
+
+    def __init__(self, loaders, filterset_class, data, request):
+        super().__init__(loaders)
+        self.filterset_class = filterset_class
+        self.data = data
+        self.request = request
+
+    def batch_load(self, keys):
+        queryset = (
+            Product.objects.filter(orderitem__order_id__in=keys)
+            .annotate(crm_order_id=F('orderitem__order_id'))
+            .order_by('orderitem__id')
+        )
+        filterset = self.filterset_class(data=self.data, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.form.errors.as_json())
+        products = list(filterset.qs)
+        self.loaders.prime(products)
+        results = defaultdict(list)
+        for product in products:
+            results[product.crm_order_id].append(product)
+        return results
+
+
+class ProductOrdersLoader(ListBatchLoader):
+    """Orders by product id (``Product.order_set``)."""
+
+    def batch_load(self, keys):
+        items = list(
+            OrderItem.objects.filter(product_id__in=keys)
+            .select_related('order')
+            .order_by('id')
+        )
+        self.loaders.prime(item.order for item in items)
+        results = defaultdict(list)
+        for item in items:
+            results[item.product_id].append(item.order)
+        return results
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of one request."""
+
+    def __init__(self):
+        self.customer = CustomerLoader(self)
+        self.customer_orders = CustomerOrdersLoader(self)
+        self.customer_stats = CustomerStatsLoader(self)
+        self.order_products = OrderProductsLoader(self)
+        self.product_orders = ProductOrdersLoader(self)
+        self.filtered_products = {}
+        # Every order seen, for filtered loaders created later
+        self.order_ids = set()
+
+    def filtered_order_products(self, filterset_class, data, request):
+        """The ``FilteredOrderProductsLoader`` for these filter arguments."""
+        key = (filterset_class, tuple(sorted((name, repr(value)) for name, value in data.items())))
+        loader = self.filtered_products.get(key)
+        if loader is None:
+            loader = FilteredOrderProductsLoader(self, filterset_class, data, request)
+            loader.pending = set(self.order_ids)
+            self.filtered_products[key] = loader
+        return loader
+
+    def prime(self, objects):
+        """Register the keys of freshly resolved objects for the next level."""
+        for obj in objects:
+            # Never touch columns the planner deferred with only()
+            deferred = obj.get_deferred_fields()
+            if isinstance(obj, Order):
+                if 'customer_id' not in deferred:
+                    self.customer.prime(obj.customer_id)
+                self.order_products.prime(obj.id)
+                self.order_ids.add(obj.id)
+                for loader in self.filtered_products.values():
+                    loader.prime(obj.id)
+            elif isinstance(obj, Customer):
+                if not deferred:
+                    self.customer.cache.setdefault(obj.id, obj)
+                    self.customer.pending.discard(obj.id)
+                orders = prefetched(obj, 'orders')
+                if orders is not None:
+                    # Seeds the next level with every sibling's orders,
+                    # not just those of the customer resolved first
+                    self.prime(orders)
+                else:
+                    self.customer_orders.prime(obj.id)
+                self.customer_stats.prime(obj.id)
+            elif isinstance(obj, Product):
+                self.product_orders.prime(obj.id)
+
+
+def prefetched(instance, name):
+    """Return relation ``name`` if prefetch_related() already loaded it."""
+    if not getattr(instance, '_prefetched_objects_cache', None):
+        return None
+    queryset = getattr(instance, name).all()
+    if queryset._result_cache is None:
+        return None
+    return list(queryset)
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request (``info.context``)."""
+    context = info.context
+    if context is None:
+        # Nowhere to keep per-request state; batching degrades to one
+        # query per field, like the plain Django resolvers.
+        return Loaders()
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, 'crm_loaders', loaders)
+    return loaders
+
+
+def clear_loaders(context):
+    """Forget the loaders bound to ``context`` once a mutation changed rows.
+
+    Operations batched into one HTTP request share the request as their
+    context, so later queries in the batch reuse earlier loader caches.
+    """
+    if getattr(context, 'crm_loaders', None) is not None:
+        context.crm_loaders = None
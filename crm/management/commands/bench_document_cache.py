@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from graphql import parse, validate
+
+from crm.persisted import DocumentCache
+from schema import schema
+
+DOCUMENTS = {
+    'crm report': """
+        query GetCRMStats {
+            crmStats { customerCount orderCount totalRevenue }
+        }
+    """,
+    'low stock restock': """
+        mutation {
+            updateLowStockProducts { success message updatedProducts { name stock } }
+        }
+    """,
+    'order reminders page': """
+        query GetPendingOrders($orderDateGte: Date, $first: Int, $after: String) {
+            pagedOrders(orderDate_Gte: $orderDateGte, first: $first, after: $after) {
+                edges { node { id customer { email } orderDate } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """,
+    'nested dashboard': """
+        query Dashboard {
+            allCustomers(first: 50) {
+                edges { node { id name email orders { edges { node { id totalAmount
+                    products { edges { node { id name price } } } } } } } }
+            }
+            allProducts(lowStock: true) { edges { node { id name stock } } }
+        }
+    """,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare parse+validate time with and without the persisted document cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        graphql_schema = schema.graphql_schema
+        cache = DocumentCache(max_size=len(DOCUMENTS))
+
+        for label, query in DOCUMENTS.items():
+            started = time.perf_counter()
+            for _ in range(iterations):
+                errors = validate(graphql_schema, parse(query))
+            uncached = (time.perf_counter() - started) / iterations
+            assert not errors, errors
+
+            cache.get_document(graphql_schema, query)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                cache.get_document(graphql_schema, query)
+            cached = (time.perf_counter() - started) / iterations
+
+            self.stdout.write(
+                f"{label:<22} parse+validate {uncached * 1e6:9.1f} us   "
+                f"cached {cached * 1e6:7.1f} us   x{uncached / cached:.0f}"
+            )
+
+        self.stdout.write(f"cache: {cache.stats()}")
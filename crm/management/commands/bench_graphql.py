@@ -0,0 +1,191 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from crm.models import Customer, Order, OrderItem, Product
+from crm.views import CRMGraphQLView
+
+
+class BenchGraphQLView(CRMGraphQLView):
+    # Measure execution: no response cache, no tracing overhead
+    response_cache = None
+    tracing = False
+
+
+def operations():
+    """The representative operations, as ``(name, query, variables, writes)``."""
+    week_ago = (timezone.localdate() - timedelta(days=7)).isoformat()
+    return [
+        ('nested orders', """
+            query NestedOrders($first: Int) {
+                pagedOrders(first: $first) { edges { node { id orderDate totalAmount
+                    customer { name email }
+                    products(first: 5) { edges { node { name price } } } } } }
+            }""", {'first': 50}, False),
+        ('customer orders', """
+            query CustomerOrders($first: Int) {
+                allCustomers(first: $first) { edges { node { name
+                    orders(first: 5) { edges { node { id totalAmount } } } } } }
+            }""", {'first': 50}, False),
+        ('filtered orders', """
+            query FilteredOrders($since: Date, $min: Decimal) {
+                allOrders(first: 50, orderDate_Gte: $since, totalAmount_Gte: $min) {
+                    edges { node { id orderDate totalAmount } } }
+            }""", {'since': week_ago, 'min': '100'}, False),
+        ('filtered customers', """
+            query FilteredCustomers($name: String) {
+                allCustomers(first: 50, name: $name) { edges { node { id name email } } }
+            }""", {'name': 'smith'}, False),
+        ('low stock products', """
+            { allProducts(first: 50, lowStock: true) { edges { node { id name stock } } } }
+            """, {}, False),
+        ('crm report', """
+            { crmStats { customerCount productCount orderCount totalRevenue } }
+            """, {}, False),
+        ('bulk create customers', """
+            mutation Bulk($input: BulkCreateCustomersInput!) {
+                bulkCreateCustomers(input: $input) { createdCount errors }
+            }""", {'input': {'customers': [
+                {'name': f'Bench {i}', 'email': f'bench-{i}@bench.invalid', 'phone': '+12345678901'}
+                for i in range(500)
+            ]}}, True),
+        ('low stock update', """
+            mutation { updateLowStockProducts { success updatedCount } }
+            """, {}, True),
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run representative GraphQL operations against the current database and "
+        "record latency percentiles, query counts and peak memory as a JSON baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--operation', action='append', dest='operations',
+                            help='Only run operations with this name (repeatable)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown before failing the comparison (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        self.view = BenchGraphQLView.as_view()
+        self.factory = RequestFactory()
+
+        selected = options['operations']
+        results = {}
+        for name, query, variables, writes in operations():
+            if selected and name not in selected:
+                continue
+            results[name] = self.measure(query, variables, writes, options['iterations'], options['warmup'])
+            stats = results[name]
+            self.stdout.write(
+                f"{name:<22} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                f"p99 {stats['p99_ms']:8.2f} ms  queries {stats['queries']:4d}  "
+                f"peak {stats['peak_kb']:9.1f} KiB"
+            )
+        if not results:
+            raise CommandError("No operation selected")
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'iterations': options['iterations'],
+                'rows': {
+                    model.__name__: model.objects.count()
+                    for model in (Customer, Product, Order, OrderItem)
+                },
+            },
+            'operations': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                self.compare(json.load(baseline), report, options['tolerance'])
+
+    def run_operation(self, query, variables, writes):
+        request = self.factory.post(
+            '/graphql', json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json',
+        )
+        with transaction.atomic():
+            response = self.view(request)
+            # Leave the dataset as generated
+            if writes:
+                transaction.set_rollback(True)
+        body = json.loads(response.content)
+        if response.status_code != 200 or body.get('errors'):
+            raise CommandError(f"Operation failed: {body.get('errors')}")
+        return body
+
+    def measure(self, query, variables, writes, iterations, warmup):
+        for _ in range(warmup):
+            self.run_operation(query, variables, writes)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.run_operation(query, variables, writes)
+
+        tracemalloc.start()
+        self.run_operation(query, variables, writes)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.run_operation(query, variables, writes)
+            samples.append((time.perf_counter() - started) * 1000)
+
+        return {
+            'iterations': iterations,
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'p50_ms': round(percentile(samples, 0.50), 3),
+            'p95_ms': round(percentile(samples, 0.95), 3),
+            'p99_ms': round(percentile(samples, 0.99), 3),
+            # Savepoint statements of the benchmark's own transaction excluded
+            'queries': sum(1 for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, baseline, report, tolerance):
+        regressions = []
+        self.stdout.write(self.style.MIGRATE_HEADING("Against baseline"))
+        for name, stats in report['operations'].items():
+            before = baseline.get('operations', {}).get(name)
+            if before is None:
+                self.stdout.write(f"{name:<22} (not in baseline)")
+                continue
+            change = stats['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+            line = (f"{name:<22} p95 {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms "
+                    f"({change:+.0%})  queries {before['queries']} -> {stats['queries']}")
+            if change > tolerance or stats['queries'] > before['queries']:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
@@ -0,0 +1,107 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import RequestFactory
+
+from crm import ingest
+from crm.models import Customer, Product
+from crm.management.commands.bench_graphql import BenchGraphQLView
+
+EMAIL_DOMAIN = 'ingest-bench.invalid'
+
+CREATE_CUSTOMER = """
+    mutation CreateCustomer($input: CreateCustomerInput!) {
+        createCustomer(input: $input) { jobId customer { id } }
+    }"""
+
+CREATE_ORDER = """
+    mutation CreateOrder($input: CreateOrderInput!) {
+        createOrder(input: $input) { jobId order { id } }
+    }"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare createCustomer/createOrder throughput written synchronously and "
+        "through the write-behind ingestion queue (bench rows are deleted afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Mutations of each kind per mode')
+        parser.add_argument('--clients', type=int, default=1, help='Concurrent senders')
+        parser.add_argument('--batch-size', type=int, default=ingest.BATCH_SIZE)
+        parser.add_argument('--max-wait', type=float, default=ingest.MAX_WAIT)
+
+    def handle(self, *args, **options):
+        if options['count'] <= 0 or options['clients'] <= 0:
+            raise CommandError("--count and --clients must be positive")
+
+        self.view = BenchGraphQLView.as_view()
+        self.factory = RequestFactory()
+        configured = ingest.ingestion_queue
+        self.clear()
+        try:
+            self.customer = Customer.objects.create(name='Ingest Bench', email=f'buyer@{EMAIL_DOMAIN}')
+            self.product = Product.objects.create(name='Ingest Bench', price=Decimal('1.00'),
+                                                  stock=10 ** 9)
+            modes = [
+                ('synchronous', None),
+                ('queued', ingest.IngestionQueue(
+                    ingest.process_batch, batch_size=options['batch_size'], max_wait=options['max_wait'],
+                )),
+            ]
+            for name, ingestion_queue in modes:
+                ingest.ingestion_queue = ingestion_queue
+                for kind in ('customer', 'order'):
+                    self.measure(name, kind, ingestion_queue, options['count'], options['clients'])
+        finally:
+            ingest.ingestion_queue = configured
+            self.clear()
+
+    def clear(self):
+        # Cascades to the bench orders and their items
+        Customer.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        Product.objects.filter(name='Ingest Bench').delete()
+
+    def variables(self, mode, kind, index):
+        if kind == 'customer':
+            return {'input': {'name': f'Bench {index}', 'email': f'{mode}-{index}@{EMAIL_DOMAIN}'}}
+        return {'input': {'customerId': str(self.customer.pk), 'productIds': [str(self.product.pk)]}}
+
+    def send(self, query, variables):
+        request = self.factory.post(
+            '/graphql', json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json',
+        )
+        try:
+            body = json.loads(self.view(request).content)
+        finally:
+            close_old_connections()
+        return not body.get('errors')
+
+    def measure(self, mode, kind, ingestion_queue, count, clients):
+        query = CREATE_CUSTOMER if kind == 'customer' else CREATE_ORDER
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            succeeded = sum(pool.map(
+                lambda index: self.send(query, self.variables(mode, kind, index)), range(count)
+            ))
+        accepted = time.perf_counter() - started
+        if ingestion_queue is not None:
+            ingestion_queue.flush()
+        elapsed = time.perf_counter() - started
+
+        if kind == 'customer':
+            written = Customer.objects.filter(email__startswith=f'{mode}-', email__endswith=f'@{EMAIL_DOMAIN}').count()
+        else:
+            written = self.customer.orders.count()
+            self.customer.orders.all().delete()
+        self.stdout.write(
+            f"{mode:<12} {kind:<9} {written}/{count} written, {count - succeeded} rejected, "
+            f"accepted in {accepted:.2f}s ({count / accepted:,.0f} req/s), "
+            f"committed in {elapsed:.2f}s ({written / elapsed:,.0f} rows/s)"
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.cleanup import BATCH_SIZE, INACTIVE_DAYS, SLEEP, delete_inactive_customers
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete customers without orders created more than --days ago, in small "
+        "primary-key batches so the table stays writable"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=INACTIVE_DAYS)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=SLEEP,
+                            help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the customers that would be deleted')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{verb} {result.deleted} so far ({result.rows_per_second:,.0f} rows/s)")
+
+        result = delete_inactive_customers(
+            days=options['days'], batch_size=options['batch_size'], sleep=options['sleep'],
+            dry_run=options['dry_run'], progress=progress,
+        )
+        self.stdout.write(
+            f"{verb} {result.deleted} inactive customers in {result.batches} batches, "
+            f"{result.elapsed:.1f}s ({result.rows_per_second:,.0f} rows/s)"
+        )
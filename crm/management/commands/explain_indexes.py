@@ -0,0 +1,118 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crm.models import Customer, Order, Product
+
+
+def hot_queries():
+    """The filters the GraphQL API, cron jobs and reports run most."""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    return [
+        ('orders keyset page',
+         Order.objects.filter(order_date__gte=week_ago).order_by('order_date', 'id')[:100]),
+        ('customer orders by date',
+         Order.objects.filter(customer_id=1, order_date__gte=week_ago).order_by('order_date')),
+        ('orders by total amount',
+         Order.objects.filter(total_amount__gte=Decimal('900'))),
+        ('low stock products',
+         Product.objects.filter(stock__lt=10)),
+        ('inactive customer cleanup',
+         Customer.objects.filter(created_at__lt=now - timedelta(days=365))),
+        ('customer name icontains',
+         Customer.objects.filter(name__icontains='smith')),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare query plans of the hot CRM filters with and without the crm indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many synthetic customers first (rolled back afterwards)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per query when timing')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            after = self.measure('after', options['repeat'])
+            with connection.cursor() as cursor:
+                for model in (Customer, Product, Order):
+                    for index in model._meta.indexes:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+            before = self.measure('before', options['repeat'])
+
+            # Nothing here is meant to persist: drop the seed data and
+            # restore the indexes.
+            transaction.set_rollback(True)
+
+        for label, _ in hot_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for state, results in (('before', before), ('after', after)):
+                plan, elapsed = results[label]
+                self.stdout.write(f"  {state} ({elapsed * 1000:.2f} ms)")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+    def explain(self, queryset, state):
+        # SQLite reuses cached EXPLAIN statements without noticing schema
+        # changes, so tag the SQL to force a fresh plan per state.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql} /* {state} */", params)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+    def measure(self, state, repeat):
+        results = {}
+        for label, queryset in hot_queries():
+            plan = self.explain(queryset, state)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            results[label] = (plan, (time.perf_counter() - started) / repeat)
+        return results
+
+    def seed(self, count):
+        rng = random.Random(0)
+        now = timezone.now()
+        customers = Customer.objects.bulk_create(
+            [
+                Customer(
+                    name=f"Customer {i}",
+                    email=f"bench-{i}@example.com",
+                    created_at=now - timedelta(days=rng.randint(0, 730)),
+                )
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+        Product.objects.bulk_create(
+            [
+                Product(name=f"Product {i}", price=Decimal(rng.randint(1, 1000)), stock=rng.randint(0, 200))
+                for i in range(max(count // 10, 1))
+            ],
+            batch_size=1000,
+        )
+        Order.objects.bulk_create(
+            [
+                Order(
+                    customer=rng.choice(customers),
+                    order_date=now - timedelta(days=rng.randint(0, 365)),
+                    total_amount=Decimal(rng.randint(1, 1000)),
+                )
+                for _ in range(count * 2)
+            ],
+            batch_size=1000,
+        )
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.export import CHUNK_SIZE, EXPORTS, ENCODERS, export
+
+
+class Command(BaseCommand):
+    help = "Stream customers or orders (one row per line item) as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(ENCODERS), default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--filter', action='append', default=[], metavar='NAME=VALUE',
+                            help='CustomerFilter/OrderFilter field, e.g. order_date__gte=2024-01-01')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters look like NAME=VALUE, got {item!r}")
+            filters[name] = value
+
+        try:
+            chunks = export(options['kind'], options['format'], filters, options['chunk_size'])
+        except ValidationError as e:
+            raise CommandError(f"Invalid filters: {e.messages[0]}")
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            output.writelines(chunks)
+        finally:
+            if output is not sys.stdout:
+                output.close()
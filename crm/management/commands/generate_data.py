@@ -0,0 +1,164 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from crm.customer_stats import rebuild_customer_stats
+from crm.models import Customer, CustomerStats, Order, OrderItem, Product
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Eve', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy',
+               'Mallory', 'Niaj', 'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter', 'Zoe']
+LAST_NAMES = ['Johnson', 'Smith', 'Williams', 'Brown', 'Davis', 'Miller', 'Wilson', 'Moore', 'Taylor',
+              'Anderson', 'Thomas', 'Jackson', 'White', 'Harris', 'Martin', 'Garcia', 'Clark', 'Lewis']
+PRODUCT_WORDS = ['Laptop', 'Mouse', 'Keyboard', 'Monitor', 'Headphones', 'Webcam', 'Dock', 'Cable',
+                 'Speaker', 'Tablet', 'Charger', 'Router', 'Drive', 'Stand', 'Lamp', 'Chair']
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large deterministic CRM dataset (customers, products, orders, "
+        "order items) with chunked bulk_create"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1_000_000)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--order-items', type=int, default=10_000_000)
+        parser.add_argument('--max-items-per-order', type=int, default=5,
+                            help='Orders get 1..N items (mean (N+1)/2)')
+        parser.add_argument('--days', type=int, default=365, help='Spread dates over this many days')
+        parser.add_argument('--until', help='Latest date (YYYY-MM-DD, default today); fix it to '
+                                            'reproduce a dataset byte for byte')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete existing CRM rows first')
+
+    def handle(self, *args, **options):
+        if options['products'] <= 0 and options['order_items'] > 0:
+            raise CommandError("Order items need at least one product")
+        if options['customers'] <= 0 and options['order_items'] > 0:
+            raise CommandError("Order items need at least one customer")
+
+        self.batch_size = options['batch_size']
+        until = date.fromisoformat(options['until']) if options['until'] else timezone.localdate()
+        self.until = timezone.make_aware(datetime.combine(until + timedelta(days=1), dt_time.min))
+        self.seconds = options['days'] * 86400
+
+        if options['clear']:
+            self.stdout.write("Clearing existing data...")
+            # Summaries first: deleting orders then has nothing to update
+            for model in (CustomerStats, OrderItem, Order, Product, Customer):
+                model.objects.all().delete()
+
+        # Explicit primary keys let orders reference customers and products
+        # without reading them back.
+        self.customer_base = self.next_id(Customer)
+        self.product_base = self.next_id(Product)
+        self.order_base = self.next_id(Order)
+
+        self.create(Customer, self.customers(options['customers'], options['seed']), options['customers'])
+        self.prices = []
+        self.create(Product, self.products(options['products'], options['seed']), options['products'])
+        self.create_orders(options['customers'], options['products'], options['order_items'],
+                           options['max_items_per_order'], options['seed'])
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Customer, Product, Order, OrderItem]):
+                cursor.execute(sql)
+
+        # bulk_create bypasses place_orders; the new orders all belong to new customers
+        self.stdout.write("Summarising customer orders...")
+        rebuild_customer_stats(start=self.customer_base - 1)
+
+    def next_id(self, model):
+        return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def random_date(self, rng):
+        return self.until - timedelta(seconds=rng.randint(1, self.seconds))
+
+    def customers(self, count, seed):
+        rng = random.Random(f'{seed}:customers')
+        for i in range(count):
+            pk = self.customer_base + i
+            phone = f'+1{rng.randrange(10**9, 10**10)}' if rng.random() < 0.7 else None
+            yield Customer(
+                pk=pk,
+                name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                email=f'customer{pk}@example.com',
+                phone=phone,
+                created_at=self.random_date(rng),
+            )
+
+    def products(self, count, seed):
+        rng = random.Random(f'{seed}:products')
+        for i in range(count):
+            cents = rng.randrange(199, 200000)
+            self.prices.append(cents)
+            yield Product(
+                pk=self.product_base + i,
+                name=f'{rng.choice(PRODUCT_WORDS)} {self.product_base + i}',
+                price=Decimal(cents) / 100,
+                stock=rng.randrange(0, 200),
+            )
+
+    def create(self, model, rows, total):
+        started = time.perf_counter()
+        created = 0
+        for chunk in chunks(rows, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.batch_size)
+            created += len(chunk)
+            self.progress(model._meta.verbose_name_plural, created, total, started)
+        self.stdout.write('')
+
+    def create_orders(self, customers, products, items, max_items, seed):
+        rng = random.Random(f'{seed}:orders')
+        started = time.perf_counter()
+        created = 0
+        order_pk = self.order_base
+        while created < items:
+            orders, order_items = [], []
+            while created < items and len(order_items) < self.batch_size:
+                count = min(rng.randint(1, max_items), items - created)
+                cents = 0
+                for index in rng.sample(range(products), min(count, products)):
+                    quantity = rng.randint(1, 3)
+                    cents += self.prices[index] * quantity
+                    order_items.append(OrderItem(
+                        order_id=order_pk, product_id=self.product_base + index, quantity=quantity,
+                    ))
+                    created += 1
+                orders.append(Order(
+                    pk=order_pk,
+                    customer_id=self.customer_base + rng.randrange(customers),
+                    order_date=self.random_date(rng),
+                    total_amount=Decimal(cents) / 100,
+                ))
+                order_pk += 1
+            with transaction.atomic():
+                Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                OrderItem.objects.bulk_create(order_items, batch_size=self.batch_size)
+            self.progress('order items', created, items, started)
+        self.stdout.write('')
+
+    def progress(self, label, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f"\r{label}: {done}/{total} ({rate:,.0f} rows/s)", ending='')
+        self.stdout.flush()
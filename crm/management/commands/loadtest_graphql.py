@@ -0,0 +1,91 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+QUERIES = {
+    'catalog': ('{ products { id name price stock } }', {}),
+    'customers page': (
+        'query ($first: Int) { allCustomers(first: $first) { edges { node { id name email } } } }',
+        {'first': 20},
+    ),
+    'orders with products': (
+        'query ($first: Int) { pagedOrders(first: $first) { edges { node { id totalAmount '
+        'customer { name } products(first: 5) { edges { node { name price } } } } } } }',
+        {'first': 20},
+    ),
+    'crm report': ('{ crmStats { customerCount orderCount totalRevenue } }', {}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure GraphQL throughput of running servers, e.g. the WSGI app "
+        "(crm.wsgi) against the ASGI app (crm.asgi) on the seeded database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='GraphQL endpoint to load (repeat to compare servers)')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint')
+        parser.add_argument('--query', choices=sorted(QUERIES), action='append', dest='queries',
+                            help='Queries to cycle through (default: all)')
+        parser.add_argument('--uncached', action='store_true',
+                            help='Send a unique variable per request so the response cache misses')
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['http://127.0.0.1:8000/graphql']
+        queries = [QUERIES[name] for name in options['queries'] or sorted(QUERIES)]
+
+        self.stdout.write(f"{'endpoint':<36} {'requests':>8} {'errors':>6} {'req/s':>8} "
+                          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+        for url in urls:
+            stats = self.load(url, queries, options['concurrency'], options['duration'],
+                              options['uncached'])
+            latencies = sorted(stats['latencies'])
+            if not latencies:
+                raise CommandError(f"No request to {url} completed")
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            self.stdout.write(
+                f"{url:<36} {len(latencies):>8} {stats['errors']:>6} "
+                f"{len(latencies) / stats['elapsed']:>8.1f} {quantiles[49] * 1000:>7.1f} "
+                f"{quantiles[94] * 1000:>7.1f} {quantiles[98] * 1000:>7.1f}"
+            )
+
+    def load(self, url, queries, concurrency, duration, uncached):
+        lock = threading.Lock()
+        stats = {'latencies': [], 'errors': 0, 'sent': 0}
+        deadline = time.perf_counter() + duration
+
+        def client(worker):
+            session = requests.Session()
+            latencies, errors, sent = [], 0, 0
+            while time.perf_counter() < deadline:
+                query, variables = queries[(worker + sent) % len(queries)]
+                if uncached:
+                    variables = dict(variables, nonce=f'{worker}-{sent}')
+                sent += 1
+                started = time.perf_counter()
+                try:
+                    response = session.post(url, data=json.dumps({'query': query, 'variables': variables}),
+                                            headers={'Content-Type': 'application/json'}, timeout=30)
+                    ok = response.status_code == 200 and 'errors' not in response.json()
+                except (requests.RequestException, ValueError):
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+            with lock:
+                stats['latencies'].extend(latencies)
+                stats['errors'] += errors
+                stats['sent'] += sent
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.customer_stats import CHUNK_SIZE, rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every customer's order summary from the orders, one chunk of customers per transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--start', type=int, default=0,
+                            help='Only customers with ids above this (resume an interrupted rebuild)')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        started = time.perf_counter()
+
+        def progress(last, written):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Up to customer {last}: {written} summaries")
+
+        written = rebuild_customer_stats(options['chunk_size'], options['start'], progress)
+        self.stdout.write(f"Rebuilt {written} customer summaries in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,148 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, close_old_connections, connections, transaction
+from django.db.models import F
+
+from crm.models import Customer, Product
+
+EMAIL_DOMAIN = 'stress-bench.invalid'
+
+# SQLite's own defaults: deferred transactions, 5s timeout; the rollback
+# journal is restored once before the run (see Command.use_options)
+DEFAULT_PROFILE = {}
+
+
+def tuned_profile():
+    return {
+        'init_command': ';'.join(
+            f'PRAGMA {name}={value}' for name, value in settings.CRM_SQLITE_PRAGMAS.items()
+        ),
+        'timeout': settings.CRM_SQLITE_BUSY_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+
+def is_lock_error(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = 0
+        self.locked = 0
+
+    def add(self, done=0, locked=0):
+        with self.lock:
+            self.done += done
+            self.locked += locked
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the SQLite database with concurrent writer and reader threads, "
+        "with SQLite's defaults and with the CRM tuning, and report lock errors "
+        "and throughput (bench rows are deleted afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--profile', choices=['default', 'tuned', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError("stress_sqlite only applies to SQLite databases")
+        if options['writers'] < 0 or options['readers'] < 0 or options['seconds'] <= 0:
+            raise CommandError("--writers/--readers must not be negative, --seconds must be positive")
+
+        profiles = {'default': DEFAULT_PROFILE, 'tuned': tuned_profile()}
+        if options['profile'] != 'both':
+            profiles = {options['profile']: profiles[options['profile']]}
+
+        database = connections.settings[DEFAULT_DB_ALIAS]
+        configured = database.get('OPTIONS', {})
+        journal_mode = self.journal_mode()
+        self.clear()
+        try:
+            self.product = Product.objects.create(name='Stress Bench', price=Decimal('1.00'), stock=0)
+            for name, profile in profiles.items():
+                self.use_options(database, profile, 'wal' if name == 'tuned' else 'delete')
+                self.measure(name, options['writers'], options['readers'], options['seconds'])
+        finally:
+            self.use_options(database, configured, journal_mode)
+            self.clear()
+
+    def journal_mode(self, mode=None):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            return cursor.execute(f'PRAGMA journal_mode={mode}' if mode else 'PRAGMA journal_mode').fetchone()[0]
+
+    def use_options(self, database, options, journal_mode):
+        # Threads open new connections with these options; the journal
+        # mode is a property of the file and needs it to be otherwise idle
+        connections.close_all()
+        database['OPTIONS'] = options
+        self.journal_mode(journal_mode)
+
+    def clear(self):
+        Customer.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        Product.objects.filter(name='Stress Bench').delete()
+
+    def write(self, profile, worker, index):
+        # Read-then-write, like update_low_stock and place_orders
+        with transaction.atomic():
+            stock = Product.objects.values_list('stock', flat=True).get(pk=self.product.pk)
+            Product.objects.filter(pk=self.product.pk).update(stock=F('stock') + 1)
+            Customer.objects.create(name=f'Stress {stock}',
+                                    email=f'{profile}-{worker}-{index}@{EMAIL_DOMAIN}')
+
+    def read(self):
+        list(Customer.objects.order_by('-pk').values('pk', 'name', 'email')[:50])
+        Product.objects.filter(stock__lt=10).count()
+
+    def worker(self, deadline, counter, operation):
+        index = 0
+        try:
+            while time.monotonic() < deadline:
+                index += 1
+                try:
+                    operation(index)
+                except OperationalError as e:
+                    if not is_lock_error(e):
+                        raise
+                    counter.add(locked=1)
+                else:
+                    counter.add(done=1)
+        finally:
+            close_old_connections()
+            connections[DEFAULT_DB_ALIAS].close()
+
+    def measure(self, profile, writers, readers, seconds):
+        writes, reads = Counter(), Counter()
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                deadline, writes, lambda index, worker=worker: self.write(profile, worker, index),
+            ))
+            for worker in range(writers)
+        ] + [
+            threading.Thread(target=self.worker, args=(deadline, reads, lambda index: self.read()))
+            for _ in range(readers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{profile:<8} {writers} writers: {writes.done} commits ({writes.done / elapsed:,.0f}/s), "
+            f"{writes.locked} locked; {readers} readers: {reads.done} reads "
+            f"({reads.done / elapsed:,.0f}/s), {reads.locked} locked"
+        )
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary onto every SQLite read replica (CRM_DB_REPLICAS), "
+        "standing in for replication when trying the replica router locally"
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The primary is not SQLite; replicate with the database's own tooling")
+        if not settings.CRM_READ_REPLICAS:
+            raise CommandError("No replicas configured; set CRM_DB_REPLICAS=replica.sqlite3")
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.CRM_READ_REPLICAS:
+                replica = connections[alias].settings_dict
+                if replica['ENGINE'] != 'django.db.backends.sqlite3':
+                    raise CommandError(f"Replica {alias} is not SQLite")
+                connections[alias].close()
+                target = sqlite3.connect(replica['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{primary['NAME']} -> {replica['NAME']} ({alias})")
+        finally:
+            source.close()
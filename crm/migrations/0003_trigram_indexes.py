@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# icontains compiles to UPPER("col"::text) LIKE UPPER('%...%') on PostgreSQL,
+# which a pg_trgm GIN index on the same expression can answer. Other
+# backends have no equivalent index type, so these are PostgreSQL-only.
+TRIGRAM_INDEXES = [
+    ('crm_customer_name_trgm_idx', 'crm_customer', 'name'),
+    ('crm_customer_email_trgm_idx', 'crm_customer', 'email'),
+    ('crm_product_name_trgm_idx', 'crm_product', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
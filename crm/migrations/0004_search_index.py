@@ -0,0 +1,144 @@
+from django.db import migrations
+
+# Full-text index behind the `search` query (see crm/search.py).
+#
+# SQLite: one FTS5 table, crm_search, kept in sync by triggers so that
+# bulk_create/update/raw deletes are covered too. Rows are keyed by
+# rowid = object id * 4 + kind (1 customer, 2 product, 3 order).
+#
+# PostgreSQL: GIN expression indexes on the same to_tsvector() expressions
+# crm/search.py queries with.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE crm_search USING fts5(
+        body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    # Customers
+    """
+    CREATE TRIGGER crm_search_customer_insert AFTER INSERT ON crm_customer BEGIN
+        INSERT INTO crm_search (rowid, body)
+        VALUES (new.id * 4 + 1, new.name || ' ' || new.email || ' ' || coalesce(new.phone, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_customer_update AFTER UPDATE OF name, email, phone ON crm_customer BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 1;
+        INSERT INTO crm_search (rowid, body)
+        VALUES (new.id * 4 + 1, new.name || ' ' || new.email || ' ' || coalesce(new.phone, ''));
+        DELETE FROM crm_search WHERE rowid IN (SELECT id * 4 + 3 FROM crm_order WHERE customer_id = new.id);
+        INSERT INTO crm_search (rowid, body)
+        SELECT id * 4 + 3, 'order ' || id || ' ' || new.name || ' ' || new.email
+        FROM crm_order WHERE customer_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_customer_delete AFTER DELETE ON crm_customer BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 1;
+    END
+    """,
+    # Products
+    """
+    CREATE TRIGGER crm_search_product_insert AFTER INSERT ON crm_product BEGIN
+        INSERT INTO crm_search (rowid, body) VALUES (new.id * 4 + 2, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_product_update AFTER UPDATE OF name ON crm_product BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 2;
+        INSERT INTO crm_search (rowid, body) VALUES (new.id * 4 + 2, new.name);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_product_delete AFTER DELETE ON crm_product BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 2;
+    END
+    """,
+    # Orders are found by number or by their customer's name/email
+    """
+    CREATE TRIGGER crm_search_order_insert AFTER INSERT ON crm_order BEGIN
+        INSERT INTO crm_search (rowid, body)
+        SELECT new.id * 4 + 3, 'order ' || new.id || ' ' || name || ' ' || email
+        FROM crm_customer WHERE id = new.customer_id;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_order_update AFTER UPDATE OF customer_id ON crm_order BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 3;
+        INSERT INTO crm_search (rowid, body)
+        SELECT new.id * 4 + 3, 'order ' || new.id || ' ' || name || ' ' || email
+        FROM crm_customer WHERE id = new.customer_id;
+    END
+    """,
+    """
+    CREATE TRIGGER crm_search_order_delete AFTER DELETE ON crm_order BEGIN
+        DELETE FROM crm_search WHERE rowid = old.id * 4 + 3;
+    END
+    """,
+    # Backfill existing rows
+    """
+    INSERT INTO crm_search (rowid, body)
+    SELECT id * 4 + 1, name || ' ' || email || ' ' || coalesce(phone, '') FROM crm_customer
+    """,
+    """
+    INSERT INTO crm_search (rowid, body) SELECT id * 4 + 2, name FROM crm_product
+    """,
+    """
+    INSERT INTO crm_search (rowid, body)
+    SELECT o.id * 4 + 3, 'order ' || o.id || ' ' || c.name || ' ' || c.email
+    FROM crm_order o JOIN crm_customer c ON c.id = o.customer_id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS crm_search_customer_insert',
+    'DROP TRIGGER IF EXISTS crm_search_customer_update',
+    'DROP TRIGGER IF EXISTS crm_search_customer_delete',
+    'DROP TRIGGER IF EXISTS crm_search_product_insert',
+    'DROP TRIGGER IF EXISTS crm_search_product_update',
+    'DROP TRIGGER IF EXISTS crm_search_product_delete',
+    'DROP TRIGGER IF EXISTS crm_search_order_insert',
+    'DROP TRIGGER IF EXISTS crm_search_order_update',
+    'DROP TRIGGER IF EXISTS crm_search_order_delete',
+    'DROP TABLE IF EXISTS crm_search',
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX IF NOT EXISTS crm_customer_search_idx ON crm_customer USING gin (
+        to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, ''))
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS crm_product_search_idx ON crm_product USING gin (
+        to_tsvector('simple', coalesce(name, ''))
+    )
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS crm_customer_search_idx',
+    'DROP INDEX IF EXISTS crm_product_search_idx',
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
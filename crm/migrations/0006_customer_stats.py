@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lifetime_value'], name='crm_custstats_value_idx'), models.Index(fields=['order_count'], name='crm_custstats_count_idx'), models.Index(fields=['last_order_date'], name='crm_custstats_last_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_customer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('run', models.CharField(max_length=32)),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='crm.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run'], name='crm_reminder_run_idx'), models.Index(fields=['date'], name='crm_reminder_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'date'), name='crm_reminder_order_date_unique')],
+            },
+        ),
+    ]
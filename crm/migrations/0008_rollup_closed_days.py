@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_reminder_log'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='last_customer_id',
+        ),
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='last_order_id',
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='rolled_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -7,6 +7,12 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination and the inactive-customer cleanup
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -15,6 +21,12 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     
+    class Meta:
+        indexes = [
+            # ProductFilter.low_stock and the low-stock restock job
+            models.Index(fields=['stock'], condition=models.Q(stock__lt=10), name='crm_product_low_stock_idx'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -24,6 +36,15 @@ class Order(models.Model):
     order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination and OrderFilter date ranges
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            # A customer's orders in date order
+            models.Index(fields=['customer', 'order_date'], name='crm_order_customer_date_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+        ]
+    
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
 
@@ -34,3 +55,75 @@ class OrderItem(models.Model):
     
     def __str__(self):
         return f"{self.quantity}x {self.product.name}"
+
+class CustomerStats(models.Model):
+    """Per-customer order summary maintained by ``crm.customer_stats``."""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.IntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Top customers by value, volume or recency
+            models.Index(fields=['lifetime_value'], name='crm_custstats_value_idx'),
+            models.Index(fields=['order_count'], name='crm_custstats_count_idx'),
+            models.Index(fields=['last_order_date'], name='crm_custstats_last_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id}: {self.order_count} orders, {self.lifetime_value}"
+
+class DailyStats(models.Model):
+    """Per-day totals maintained incrementally by ``crm.rollups``."""
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    new_customers = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders"
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='crm_daily_product_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: {self.quantity}x {self.product_id}"
+
+class RollupWatermark(models.Model):
+    """Last closed day recomputed into the rollups by ``crm.rollups``."""
+    name = models.CharField(max_length=50, unique=True)
+    rolled_through = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: through {self.rolled_through}"
+
+class ReminderLog(models.Model):
+    """Order reminder claimed (and sent) by ``crm.reminders`` on ``date``."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reminders')
+    date = models.DateField()
+    run = models.CharField(max_length=32)
+    sent_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            # At most one reminder per order and day, however often the job runs
+            models.UniqueConstraint(fields=['order', 'date'], name='crm_reminder_order_date_unique'),
+        ]
+        indexes = [
+            # Claimed rows of a run; pruning old days
+            models.Index(fields=['run'], name='crm_reminder_run_idx'),
+            models.Index(fields=['date'], name='crm_reminder_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date}: order {self.order_id}"
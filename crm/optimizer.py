@@ -0,0 +1,143 @@
+"""
+Selection-set aware queryset planner.
+
+``optimize_queryset(queryset, info)`` walks the GraphQL selection of the
+field being resolved and narrows the queryset to what the client asked for:
+``only()`` for scalar columns, ``select_related()`` for forward foreign keys
+and ``prefetch_related(Prefetch(...))`` for reverse and many-to-many
+relations, recursively. Relay connections are unwrapped through
+``edges { node { ... } }``.
+"""
+
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+PAGINATION_ARGS = ('first', 'last', 'before', 'after', 'offset')
+
+# GraphQL fields served from a one-to-one row: {model label: {field: path}}
+RELATED_COLUMNS = {
+    'crm.customer': {
+        'order_count': 'stats__order_count',
+        'lifetime_value': 'stats__lifetime_value',
+        'last_order_date': 'stats__last_order_date',
+    },
+}
+
+
+def collect_fields(selection_set, info, fields=None):
+    """Merge the selections of a selection set by response field name."""
+    if fields is None:
+        fields = {}
+    if selection_set is None:
+        return fields
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            collect_fields(fragment.selection_set, info, fields)
+        elif isinstance(selection, InlineFragmentNode):
+            collect_fields(selection.selection_set, info, fields)
+    return fields
+
+
+def collect_subfields(field_nodes, info):
+    fields = {}
+    for field_node in field_nodes:
+        collect_fields(field_node.selection_set, info, fields)
+    return fields
+
+
+def node_fields(field_nodes, info):
+    """Return the object-level selections, unwrapping relay connections."""
+    fields = collect_subfields(field_nodes, info)
+    if 'edges' in fields:
+        edges = collect_subfields(fields['edges'], info)
+        return collect_subfields(edges.get('node', []), info)
+    return fields
+
+
+def has_filter_arguments(field_nodes):
+    return any(
+        argument.name.value not in PAGINATION_ARGS
+        for field_node in field_nodes
+        for argument in field_node.arguments
+    )
+
+
+def model_fields_by_name(model):
+    """Map accessor names (``orders``, ``order_set``) to model fields."""
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def plan(model, selections, info, prefix='', required=()):
+    """Return ``(only, select_related, prefetches)`` for a model selection."""
+    only = [prefix + model._meta.pk.name]
+    only.extend(prefix + name for name in required)
+    select_related = []
+    prefetches = []
+    by_name = model_fields_by_name(model)
+    related_columns = RELATED_COLUMNS.get(model._meta.label_lower, {})
+
+    for name, field_nodes in selections.items():
+        snake = to_snake_case(name)
+        if snake in related_columns:
+            path = related_columns[snake]
+            select_related.append(prefix + path.split('__')[0])
+            only.append(prefix + path)
+            continue
+        field = by_name.get(snake)
+        if field is None or snake == 'id':
+            continue
+
+        if not field.is_relation:
+            only.append(prefix + field.name)
+        elif field.concrete and (field.many_to_one or field.one_to_one):
+            path = prefix + field.name
+            select_related.append(path)
+            only.append(path)
+            sub_only, sub_related, sub_prefetches = plan(
+                field.related_model, node_fields(field_nodes, info), info, path + '__'
+            )
+            only.extend(sub_only)
+            select_related.extend(sub_related)
+            prefetches.extend(sub_prefetches)
+        elif not has_filter_arguments(field_nodes):
+            # Reverse foreign keys need their back-reference column to be
+            # attached to the parent rows; many-to-many joins carry it.
+            back_reference = (field.field.name,) if field.one_to_many else ()
+            queryset = optimize_model_queryset(
+                field.related_model._default_manager.all(),
+                node_fields(field_nodes, info),
+                info,
+                back_reference,
+            )
+            prefetches.append(Prefetch(prefix + snake, queryset=queryset))
+
+    return only, select_related, prefetches
+
+
+def optimize_model_queryset(queryset, selections, info, required=()):
+    only, select_related, prefetches = plan(queryset.model, selections, info, required=required)
+    queryset = queryset.only(*only)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def optimize_queryset(queryset, info, required=()):
+    """Apply only/select_related/prefetch_related for ``info``'s selection.
+
+    ``required`` names extra columns the caller reads itself (e.g. the
+    ordering columns of a keyset cursor).
+    """
+    return optimize_model_queryset(queryset, node_fields(info.field_nodes, info), info, required)
@@ -0,0 +1,132 @@
+"""
+Order placement shared by ``CreateOrder`` and batch consumers.
+
+Orders are written in one transaction per call: the products are fetched
+and locked in one query, orders and ``OrderItem`` rows are inserted with
+one ``bulk_create`` each and stock is decremented for every product with a
+single ``UPDATE`` built from ``F()`` expressions.
+"""
+
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .customer_stats import record_orders
+from .models import Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+
+
+def merge_lines(lines):
+    """Collapse ``(product_id, quantity)`` lines into one quantity per product."""
+    quantities = OrderedDict()
+    for product_id, quantity in lines:
+        if quantity is None:
+            quantity = 1
+        if quantity <= 0:
+            raise ValidationError("Quantity must be positive")
+        product_id = str(product_id)
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def to_pk(model, value):
+    try:
+        return model._meta.pk.to_python(value)
+    except ValidationError:
+        return None
+
+
+def place_orders(requests):
+    """Place ``(customer_id, lines, order_date)`` requests in one transaction.
+
+    Customers and products are fetched once for the whole batch, stock is
+    checked against what earlier requests in the batch already took, and
+    orders and items are written with one ``bulk_create`` each. Returns an
+    ``Order`` or the ``ValidationError`` that rejected it per request, in
+    order; a rejected request does not affect the others.
+    """
+    results = [None] * len(requests)
+    pending = []
+    for index, (customer_id, lines, order_date) in enumerate(requests):
+        try:
+            quantities = merge_lines(lines)
+            if not quantities:
+                raise ValidationError("At least one product must be selected")
+        except ValidationError as e:
+            results[index] = e
+            continue
+        pending.append((index, to_pk(Customer, customer_id), quantities, order_date))
+    if not pending:
+        return results
+
+    with transaction.atomic():
+        customers = Customer.objects.in_bulk(
+            {customer_id for _, customer_id, _, _ in pending if customer_id is not None}
+        )
+        product_ids = {
+            product_id: to_pk(Product, product_id)
+            for _, _, quantities, _ in pending
+            for product_id in quantities
+        }
+        products = Product.objects.select_for_update().in_bulk(
+            {pk for pk in product_ids.values() if pk is not None}
+        )
+        stock = {pk: product.stock for pk, product in products.items()}
+
+        orders, lines = [], []
+        for index, customer_id, quantities, order_date in pending:
+            if customer_id not in customers:
+                results[index] = ValidationError("Invalid customer ID")
+                continue
+            chosen = [(products.get(product_ids[product_id]), quantity)
+                      for product_id, quantity in quantities.items()]
+            if any(product is None for product, _ in chosen):
+                results[index] = ValidationError("Invalid product ID")
+                continue
+            short = next((product for product, quantity in chosen if stock[product.pk] < quantity), None)
+            if short is not None:
+                results[index] = ValidationError(f"Insufficient stock for {short.name}")
+                continue
+            for product, quantity in chosen:
+                stock[product.pk] -= quantity
+
+            fields = {
+                'customer': customers[customer_id],
+                'total_amount': sum(product.price * quantity for product, quantity in chosen),
+            }
+            if order_date is not None:
+                # Queued orders carry ISO strings
+                fields['order_date'] = Order._meta.get_field('order_date').to_python(order_date)
+            order = Order(**fields)
+            results[index] = order
+            orders.append(order)
+            lines.extend((order, product, quantity) for product, quantity in chosen)
+
+        if orders:
+            Order.objects.bulk_create(orders)
+            record_orders(orders)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity)
+                for order, product, quantity in lines
+            ])
+            taken = {pk: products[pk].stock - left for pk, left in stock.items() if products[pk].stock != left}
+            Product.objects.filter(pk__in=list(taken)).update(
+                stock=Case(
+                    *[When(pk=pk, then=F('stock') - quantity) for pk, quantity in taken.items()],
+                    default=F('stock'),
+                )
+            )
+            # bulk_create and update() send no post_save
+            invalidate(Order, OrderItem, Product)
+
+    return results
+
+
+def place_order(customer_id, lines, order_date=None):
+    """Create an order for ``(product_id, quantity)`` lines and return it."""
+    result = place_orders([(customer_id, lines, order_date)])[0]
+    if isinstance(result, ValidationError):
+        raise result
+    return result
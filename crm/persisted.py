@@ -0,0 +1,126 @@
+"""
+Automatic persisted queries and a parsed/validated document cache.
+
+Clients may send ``extensions.persistedQuery.sha256Hash`` instead of (or
+along with) the query text, following the Apollo APQ protocol. Whether the
+hash is sent or derived from the text, the parsed and validated
+``DocumentNode`` is kept in a bounded LRU so repeated documents skip
+``parse()`` and ``validate()`` entirely.
+
+Settings:
+
+- ``CRM_DOCUMENT_CACHE_SIZE``: maximum number of cached documents (500).
+- ``CRM_PERSISTED_QUERIES``: path to a JSON manifest ``{sha256: query}``
+  of known documents, usable by hash even before first use.
+- ``CRM_PERSISTED_QUERIES_ONLY``: reject any document that is not in the
+  manifest (False).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import GraphQLError, parse, validate
+
+from graphene_django.settings import graphene_settings
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def load_manifest(path):
+    if not path:
+        return {}
+    with open(path) as manifest:
+        return json.load(manifest)
+
+
+class PersistedQueryNotFound(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            'PersistedQueryNotFound',
+            extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+        )
+
+
+class DocumentCache:
+    """Thread-safe LRU of validated documents keyed by query hash."""
+
+    def __init__(self, max_size=500, manifest=None, allowlist_only=False):
+        self.max_size = max_size
+        self.manifest = manifest or {}
+        self.allowlist_only = allowlist_only
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            document = self.documents.get(key)
+            if document is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.documents.move_to_end(key)
+            return document
+
+    def put(self, key, document):
+        with self.lock:
+            self.documents[key] = document
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.max_size:
+                self.documents.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.documents),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def get_document(self, schema, query=None, sha256_hash=None, validation_rules=None):
+        """Return ``(document, validation_errors)`` for a query or its hash.
+
+        Raises ``GraphQLError`` for unknown hashes, hash mismatches, documents
+        outside the allowlist and syntax errors.
+        """
+        if query and sha256_hash and query_hash(query) != sha256_hash:
+            raise GraphQLError('provided sha does not match query')
+        key = sha256_hash or query_hash(query)
+
+        document = self.get(key)
+        if document is not None:
+            return document, []
+
+        if self.allowlist_only and key not in self.manifest:
+            raise GraphQLError('Query is not in the persisted query allowlist')
+        if not query:
+            query = self.manifest.get(key)
+            if query is None:
+                raise PersistedQueryNotFound()
+
+        document = parse(query)
+        errors = validate(schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        if not errors:
+            self.put(key, document)
+        return document, errors
+
+
+document_cache = DocumentCache(
+    max_size=getattr(settings, 'CRM_DOCUMENT_CACHE_SIZE', 500),
+    manifest=load_manifest(getattr(settings, 'CRM_PERSISTED_QUERIES', None)),
+    allowlist_only=getattr(settings, 'CRM_PERSISTED_QUERIES_ONLY', False),
+)
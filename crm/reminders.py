@@ -0,0 +1,210 @@
+"""
+Daily reminders for recent orders (``crm/cron_jobs/send_order_reminders.py``).
+
+Orders placed in the last ``CRM_REMINDER_WINDOW_DAYS`` days get one
+reminder a day. ``dispatch_reminders`` walks the orders that have no
+``ReminderLog`` row for today in primary-key order, ``batch_size`` at a
+time, and claims each batch with a single ``INSERT ... ON CONFLICT DO
+NOTHING``, so reruns and overlapping runs skip what was already taken.
+Claimed reminders are sent on a pool of ``CRM_REMINDER_WORKERS`` threads,
+throttled to ``CRM_REMINDER_RATE`` per second. Claims of failed sends are
+released so the next run retries them. If a run dies mid-batch, that
+batch's reminders are skipped for the day rather than sent twice.
+
+Reminders go through ``CRM_REMINDER_BACKEND``: ``'file'`` (appends to
+``CRM_REMINDER_LOG_FILE``), ``'console'``, or the dotted path of a class
+whose ``send(reminder)`` is thread-safe.
+"""
+
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from graphql_relay import to_global_id
+
+from .models import Order, ReminderLog
+
+logger = logging.getLogger('crm.reminders')
+
+BACKEND = getattr(settings, 'CRM_REMINDER_BACKEND', 'file')
+LOG_FILE = getattr(settings, 'CRM_REMINDER_LOG_FILE', '/tmp/order_reminders_log.txt')
+WINDOW_DAYS = getattr(settings, 'CRM_REMINDER_WINDOW_DAYS', 7)
+BATCH_SIZE = getattr(settings, 'CRM_REMINDER_BATCH_SIZE', 500)
+WORKERS = getattr(settings, 'CRM_REMINDER_WORKERS', 8)
+RATE = getattr(settings, 'CRM_REMINDER_RATE', 50)
+
+Reminder = namedtuple('Reminder', ['order_id', 'email', 'order_date'])
+
+
+def reminder_line(reminder):
+    return (
+        f"{timezone.localtime():%Y-%m-%d %H:%M:%S}: Order ID {to_global_id('OrderType', reminder.order_id)}, "
+        f"Customer Email: {reminder.email}\n"
+    )
+
+
+class FileBackend:
+    """Appends one line per reminder to ``CRM_REMINDER_LOG_FILE``."""
+
+    def __init__(self, path=LOG_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def send(self, reminder):
+        with self.lock, open(self.path, 'a') as log_file:
+            log_file.write(reminder_line(reminder))
+
+
+class ConsoleBackend:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def send(self, reminder):
+        with self.lock:
+            self.stream.write(reminder_line(reminder))
+
+
+BACKENDS = {
+    'file': FileBackend,
+    'console': ConsoleBackend,
+}
+
+
+def get_backend(name=BACKEND):
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    try:
+        return import_string(name)()
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            f"CRM_REMINDER_BACKEND must be one of {sorted(BACKENDS)} or a dotted path: {e}"
+        )
+
+
+class RateLimiter:
+    """Spaces calls ``1 / rate`` seconds apart across threads; no limit without a rate."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next, now)
+            self.next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DispatchResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        if not self.elapsed:
+            return float(self.sent)
+        return self.sent / self.elapsed
+
+    def __str__(self):
+        return (
+            f"{self.sent} sent, {self.failed} failed, {self.skipped} skipped "
+            f"in {self.elapsed:.1f}s ({self.rate:,.0f}/s)"
+        )
+
+
+def pending_orders(day, window_days=WINDOW_DAYS):
+    """Orders in the window without a reminder on ``day``."""
+    since = timezone.make_aware(datetime.combine(day - timedelta(days=window_days), dt_time.min))
+    return Order.objects.filter(order_date__gte=since).filter(
+        ~Exists(ReminderLog.objects.filter(order=OuterRef('pk'), date=day))
+    )
+
+
+def claim(order_ids, day, run):
+    """Claim reminders for ``order_ids`` not taken by another run yet."""
+    with transaction.atomic():
+        ReminderLog.objects.bulk_create(
+            [ReminderLog(order_id=order_id, date=day, run=run) for order_id in order_ids],
+            ignore_conflicts=True,
+        )
+    return [
+        Reminder(*row)
+        for row in ReminderLog.objects.filter(run=run, order_id__in=order_ids)
+        .order_by('order_id')
+        .values_list('order_id', 'order__customer__email', 'order__order_date')
+    ]
+
+
+def send(backend, limiter, reminder):
+    limiter.wait()
+    try:
+        backend.send(reminder)
+    except Exception:
+        logger.warning("Reminder for order %s failed", reminder.order_id, exc_info=True)
+        return False
+    return True
+
+
+def dispatch_reminders(backend=None, day=None, window_days=WINDOW_DAYS, batch_size=BATCH_SIZE,
+                       workers=WORKERS, rate=RATE, progress=None):
+    """Send today's pending reminders; returns a ``DispatchResult``.
+
+    ``progress(result)`` is called after every batch.
+    """
+    backend = backend or get_backend()
+    day = day or timezone.localdate()
+    run = uuid.uuid4().hex
+    limiter = RateLimiter(rate)
+    candidates = pending_orders(day, window_days).order_by('pk').values_list('pk', flat=True)
+    result = DispatchResult()
+    started = time.perf_counter()
+    last = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crm-reminder') as pool:
+        while True:
+            ids = list(candidates.filter(pk__gt=last)[:batch_size])
+            if not ids:
+                break
+            last = ids[-1]
+            reminders = claim(ids, day, run)
+            outcomes = list(pool.map(lambda reminder: send(backend, limiter, reminder), reminders))
+            failed = [reminder.order_id for reminder, sent in zip(reminders, outcomes) if not sent]
+            if failed:
+                # Retried by the next run
+                ReminderLog.objects.filter(run=run, order_id__in=failed).delete()
+
+            result.sent += len(reminders) - len(failed)
+            result.failed += len(failed)
+            result.skipped += len(ids) - len(reminders)
+            result.batches += 1
+            result.elapsed = time.perf_counter() - started
+            if progress is not None:
+                progress(result)
+            if len(ids) < batch_size:
+                break
+
+    # Only today's rows matter; older ones are kept for the window
+    ReminderLog.objects.filter(date__lt=day - timedelta(days=window_days)).delete()
+    result.elapsed = time.perf_counter() - started
+    logger.info("Order reminders for %s: %s", day, result)
+    return result
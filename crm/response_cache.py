@@ -0,0 +1,320 @@
+"""
+Response cache for read-only GraphQL operations.
+
+Responses are keyed by the normalized document, operation name, variables
+and the current *version* of every model the operation reads. Writing a
+model bumps its version (``post_save``/``post_delete`` for ``Customer``,
+``Product``, ``Order`` and ``OrderItem``, plus explicit calls from the bulk
+write paths that bypass signals), and entries cached under older versions
+simply age out of the backend.
+
+Versions are only as shared as the backend. With ``'django'`` over a
+cache every process uses (``CRM_CACHE_URL``), a write anywhere misses
+everywhere. The ``'local'`` LRU only sees writes made by its own process:
+writes from other web workers, cron/Celery jobs, management commands or
+Celery ingestion leave its entries stale for up to
+``CRM_RESPONSE_CACHE_TTL`` seconds.
+
+Settings:
+
+- ``CRM_RESPONSE_CACHE_BACKEND``: ``'local'`` (in-process LRU with TTL,
+  the default without ``CRM_CACHE_URL``), ``'django'`` (a Django cache
+  alias, the default with it) or ``None`` to disable.
+- ``CRM_RESPONSE_CACHE_ALIAS``: Django cache alias for ``'django'``.
+- ``CRM_RESPONSE_CACHE_SIZE``: maximum entries of the local LRU.
+- ``CRM_RESPONSE_CACHE_TTL``: entry lifetime in seconds.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphene import relay
+from graphene_django import DjangoObjectType
+from graphql import (
+    FieldNode, FragmentSpreadNode, InlineFragmentNode, OperationType,
+    get_named_type, get_operation_ast, is_object_type, is_union_type, print_ast,
+)
+
+from .models import Customer, Order, OrderItem, Product
+
+CACHED_MODELS = (Customer, Product, Order, OrderItem)
+ALL_MODELS = frozenset(model._meta.label_lower for model in CACHED_MODELS)
+
+# Filter arguments that read a model other than the type they return
+ARGUMENT_MODELS = {
+    'customerName': 'crm.customer',
+    'productName': 'crm.product',
+    'productId': 'crm.orderitem',
+}
+
+# Root fields whose answers change without any model write
+UNCACHED_FIELDS = {'ingestionStatus'}
+
+
+class LocalBackend:
+    """In-process LRU with per-entry TTL."""
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        # Versions live outside the LRU: evicting one would let entries
+        # cached under an older version be served again.
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def get_versions(self, keys):
+        with self.lock:
+            return [self.versions.get(key, 0) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            return self.versions[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DjangoCacheBackend:
+    """Adapter over a configured Django cache (e.g. Redis or Memcached)."""
+
+    evictions = None
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def get_versions(self, keys):
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        for key in missing:
+            # Seed lost or new versions from the clock so a version evicted
+            # by the cache server never repeats an older one.
+            self.cache.add(key, time.time_ns(), None)
+        if missing:
+            found.update(self.cache.get_many(missing))
+        return [found.get(key, 0) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def incr(self, key):
+        self.cache.add(key, time.time_ns(), None)
+        return self.cache.incr(key)
+
+    def clear(self):
+        self.cache.clear()
+
+    def __len__(self):
+        return 0
+
+
+def version_key(label):
+    return f'crm:response:version:{label}'
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self, *models):
+        for model in models:
+            self.backend.incr(version_key(model._meta.label_lower))
+            self.invalidations += 1
+
+    def versions(self, labels):
+        return self.backend.get_versions([version_key(label) for label in sorted(labels)])
+
+    def key_for(self, schema, document, operation_name, variables):
+        """Return the cache key for a query operation, or None if uncacheable."""
+        plan = get_plan(schema, document, operation_name)
+        if plan is None:
+            return None
+        normalized, labels = plan
+        payload = json.dumps(
+            [normalized, operation_name, variables or {}, self.versions(labels)],
+            sort_keys=True,
+            default=str,
+        )
+        return 'crm:response:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, data):
+        self.backend.set(key, data, self.ttl)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'size': len(self.backend),
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+def get_plan(schema, document, operation_name):
+    """Return ``(normalized document, model labels)`` for a query, memoized.
+
+    The plan is stored on the ``DocumentNode`` itself, which the persisted
+    document cache reuses across requests.
+    """
+    plans = getattr(document, 'crm_response_plans', None)
+    if plans is None:
+        plans = document.crm_response_plans = {}
+    if operation_name not in plans:
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            plans[operation_name] = None
+        else:
+            fragments = {
+                definition.name.value: definition
+                for definition in document.definitions
+                if hasattr(definition, 'type_condition')
+            }
+            labels = set()
+            root_fields = list(iter_fields(operation.selection_set, fragments))
+            if any(field_node.name.value in UNCACHED_FIELDS for field_node in root_fields):
+                plans[operation_name] = None
+                return None
+            for field_node in root_fields:
+                field = schema.query_type.fields.get(field_node.name.value)
+                if field is None:
+                    continue
+                named = get_named_type(field.type)
+                if not is_object_type(named) and not is_union_type(named):
+                    continue
+                labels |= selection_models(schema, named, field_node, fragments)
+            if labels & {'crm.order', 'crm.product'}:
+                labels.add('crm.orderitem')
+            plans[operation_name] = (print_ast(document), frozenset(labels))
+    return plans[operation_name]
+
+
+def iter_fields(selection_set, fragments):
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            yield from iter_fields(fragments[selection.name.value].selection_set, fragments)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from iter_fields(selection.selection_set, fragments)
+
+
+def django_model_label(graphql_type):
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    if isinstance(graphene_type, type) and issubclass(graphene_type, DjangoObjectType):
+        return graphene_type._meta.model._meta.label_lower
+    return None
+
+
+def is_relay_plumbing(graphql_type):
+    """Connection, edge and ``PageInfo`` types, which read no table themselves."""
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    if isinstance(graphene_type, type) and issubclass(graphene_type, relay.Connection):
+        return True
+    return graphql_type.name == 'PageInfo' or {'node', 'cursor'} <= set(graphql_type.fields)
+
+
+def selection_models(schema, parent_type, field_node, fragments):
+    """Model labels of every Django type reachable from a field's selection."""
+    labels = set()
+    if field_node.selection_set is None:
+        return labels
+    if is_union_type(parent_type):
+        # Every member of a union may be returned
+        candidates = parent_type.types
+    else:
+        candidates = [parent_type]
+    for argument in field_node.arguments:
+        if argument.name.value in ARGUMENT_MODELS:
+            labels.add(ARGUMENT_MODELS[argument.name.value])
+    for candidate in candidates:
+        label = django_model_label(candidate)
+        if label:
+            labels.add(label)
+        elif not is_relay_plumbing(candidate):
+            # Aggregates (crmStats, search hits...) read the tables without
+            # exposing model types, so they depend on everything.
+            labels |= ALL_MODELS
+        for child in iter_fields(field_node.selection_set, fragments):
+            field = candidate.fields.get(child.name.value)
+            if field is None:
+                continue
+            named = get_named_type(field.type)
+            if is_object_type(named) or is_union_type(named):
+                labels |= selection_models(schema, named, child, fragments)
+    return labels
+
+
+def build_response_cache():
+    backend_name = getattr(settings, 'CRM_RESPONSE_CACHE_BACKEND', 'local')
+    if not backend_name:
+        return None
+    if backend_name == 'django':
+        backend = DjangoCacheBackend(getattr(settings, 'CRM_RESPONSE_CACHE_ALIAS', 'default'))
+    else:
+        backend = LocalBackend(getattr(settings, 'CRM_RESPONSE_CACHE_SIZE', 1000))
+    return ResponseCache(backend, ttl=getattr(settings, 'CRM_RESPONSE_CACHE_TTL', 60))
+
+
+response_cache = build_response_cache()
+
+
+def invalidate(*models):
+    """Bump model versions now and again once the transaction commits.
+
+    The second bump stops a concurrent reader from caching pre-commit data
+    under the new version. Call this directly after writes that bypass
+    ``post_save``/``post_delete`` (``bulk_create``, ``update()``).
+    """
+    if response_cache is None:
+        return
+    response_cache.invalidate(*models)
+    transaction.on_commit(lambda: response_cache.invalidate(*models))
@@ -0,0 +1,305 @@
+"""
+Daily rollups of orders, revenue, new customers and items sold.
+
+``update_rollups`` recomputes whole *closed* days (before today) into
+``DailyStats``/``DailyProductSales``, ``chunk_days`` days per transaction,
+replacing what was stored, and records the last one in
+``RollupWatermark.rolled_through``. Every run starts again
+``CRM_ROLLUP_LAG_DAYS`` days behind that mark, so rows committed late
+(long transactions, backdated ``order_date``), edits and deletions inside
+the window are picked up; a watermark on ``Order.id`` would skip rows
+whose transaction commits after a larger id was already rolled up. A run
+costs O(rows in the window plus new days), and an interrupted backfill
+resumes where it stopped.
+
+Readers combine the rollups with the *tail* (rows dated after the mark,
+aggregated on the fly), so totals include today's orders. Changes to days
+older than the window need ``manage.py rollup_stats --rebuild``.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Customer, DailyProductSales, DailyStats, Order, OrderItem, RollupWatermark
+
+CHUNK_DAYS = getattr(settings, 'CRM_ROLLUP_CHUNK_DAYS', 31)
+LAG_DAYS = getattr(settings, 'CRM_ROLLUP_LAG_DAYS', 2)
+
+WATERMARK = 'daily'
+
+CENT = Decimal('0.01')
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def cents(amount):
+    """``amount`` rounded to cents the way invoices are (half up)."""
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def get_watermark():
+    return RollupWatermark.objects.get_or_create(name=WATERMARK)[0]
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def date_range(queryset, field, since=None, until=None):
+    """Rows whose ``field`` falls on the days ``[since, until]`` (open ends: unbounded)."""
+    if since is not None:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(since)})
+    if until is not None:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(until + timedelta(days=1))})
+    return queryset
+
+
+def aggregate_orders(since=None, until=None):
+    """``{date: (order_count, revenue)}`` for orders placed on ``[since, until]``."""
+    rows = (
+        date_range(Order.objects.order_by(), 'order_date', since, until)
+        .annotate(day=TruncDate('order_date'))
+        .values('day')
+        .annotate(order_count=Count('id'), revenue=Coalesce(Sum('total_amount'), ZERO))
+    )
+    return {row['day']: (row['order_count'], cents(row['revenue'])) for row in rows}
+
+
+def aggregate_items(since=None, until=None):
+    """``{(date, product_id): quantity}`` for items of orders placed on ``[since, until]``."""
+    rows = (
+        date_range(OrderItem.objects.order_by(), 'order__order_date', since, until)
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day', 'product_id')
+        .annotate(quantity=Sum('quantity'))
+    )
+    return {(row['day'], row['product_id']): row['quantity'] for row in rows}
+
+
+def aggregate_customers(since=None, until=None):
+    """``{date: new_customers}`` for customers created on ``[since, until]``."""
+    rows = (
+        date_range(Customer.objects.order_by(), 'created_at', since, until)
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(new_customers=Count('id'))
+    )
+    return {row['day']: row['new_customers'] for row in rows}
+
+
+def first_day():
+    """Day of the oldest order or customer, or None without any."""
+    oldest = [
+        value for value in (
+            Order.objects.aggregate(oldest=Min('order_date'))['oldest'],
+            Customer.objects.aggregate(oldest=Min('created_at'))['oldest'],
+        )
+        if value is not None
+    ]
+    return timezone.localdate(min(oldest)) if oldest else None
+
+
+def roll_days(since, until):
+    """Replace the rollups of ``[since, until]``; returns ``(orders, customers)`` counted."""
+    orders = aggregate_orders(since, until)
+    items = aggregate_items(since, until)
+    customers = aggregate_customers(since, until)
+
+    rows = {}
+
+    def row_for(day):
+        if day not in rows:
+            rows[day] = DailyStats(date=day)
+        return rows[day]
+
+    for day, (order_count, revenue) in orders.items():
+        row = row_for(day)
+        row.order_count = order_count
+        row.revenue = revenue
+    for (day, _), quantity in items.items():
+        row_for(day).items_sold += quantity
+    for day, count in customers.items():
+        row_for(day).new_customers = count
+
+    DailyProductSales.objects.filter(date__range=(since, until)).delete()
+    DailyStats.objects.filter(date__range=(since, until)).delete()
+    DailyStats.objects.bulk_create(rows.values())
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(date=day, product_id=product_id, quantity=quantity)
+        for (day, product_id), quantity in items.items()
+    ])
+    return (
+        sum(order_count for order_count, _ in orders.values()),
+        sum(customers.values()),
+    )
+
+
+def update_rollups(chunk_days=CHUNK_DAYS, max_chunks=None, lag_days=LAG_DAYS):
+    """Recompute closed days from ``lag_days`` before the mark through yesterday.
+
+    Each chunk of at most ``chunk_days`` days commits with the advanced
+    mark. Returns ``{'orders': n, 'customers': n, 'days': n}`` recomputed.
+    """
+    watermark = get_watermark()
+    if watermark.rolled_through is None:
+        start = first_day()
+    else:
+        start = watermark.rolled_through + timedelta(days=1) - timedelta(days=lag_days)
+    closed = timezone.localdate() - timedelta(days=1)
+    totals = {'orders': 0, 'customers': 0, 'days': 0}
+    chunks = 0
+    while start is not None and start <= closed and (max_chunks is None or chunks < max_chunks):
+        until = min(start + timedelta(days=chunk_days - 1), closed)
+        with transaction.atomic():
+            # Serialises concurrent runs
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            orders, customers = roll_days(start, until)
+            if watermark.rolled_through is None or watermark.rolled_through < until:
+                watermark.rolled_through = until
+            watermark.save()
+        totals['orders'] += orders
+        totals['customers'] += customers
+        totals['days'] += (until - start).days + 1
+        chunks += 1
+        start = until + timedelta(days=1)
+    return totals
+
+
+def reset_rollups():
+    with transaction.atomic():
+        DailyProductSales.objects.all().delete()
+        DailyStats.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).update(rolled_through=None)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+class RollupOrderStats:
+    """``OrderStats`` over every order, read from the rollups plus the tail."""
+
+    @cached_property
+    def watermark(self):
+        return get_watermark()
+
+    @cached_property
+    def tail_start(self):
+        """First day not in the rollups (None: nothing rolled up yet)."""
+        if self.watermark.rolled_through is None:
+            return None
+        return self.watermark.rolled_through + timedelta(days=1)
+
+    def rolled(self, model):
+        """``model`` rows the tail does not cover (the mark is the only truth)."""
+        if self.watermark.rolled_through is None:
+            return model.objects.none()
+        return model.objects.filter(date__lte=self.watermark.rolled_through)
+
+    @cached_property
+    def tail_orders(self):
+        return aggregate_orders(self.tail_start)
+
+    @cached_property
+    def tail_items(self):
+        return aggregate_items(self.tail_start)
+
+    @cached_property
+    def tail_customers(self):
+        return aggregate_customers(self.tail_start)
+
+    @cached_property
+    def totals(self):
+        rolled = self.rolled(DailyStats).aggregate(
+            order_count=Coalesce(Sum('order_count'), 0),
+            total_revenue=Coalesce(Sum('revenue'), ZERO),
+        )
+        order_count = rolled['order_count'] + sum(count for count, _ in self.tail_orders.values())
+        revenue = rolled['total_revenue'] + sum(revenue for _, revenue in self.tail_orders.values())
+        return {
+            'order_count': order_count,
+            'total_revenue': cents(revenue),
+            'average_order_value': cents(revenue / order_count) if order_count else None,
+        }
+
+    @property
+    def order_count(self):
+        return self.totals['order_count']
+
+    @property
+    def total_revenue(self):
+        return self.totals['total_revenue']
+
+    @property
+    def average_order_value(self):
+        return self.totals['average_order_value']
+
+    def days(self, since=None):
+        """Merged per-day rows (rollups plus tail), oldest first."""
+        queryset = self.rolled(DailyStats).order_by('date')
+        if since is not None:
+            queryset = queryset.filter(date__gte=since)
+        rows = {
+            row['date']: dict(row)
+            for row in queryset.values('date', 'order_count', 'revenue', 'new_customers', 'items_sold')
+        }
+
+        def row_for(day):
+            if day not in rows:
+                rows[day] = {'date': day, 'order_count': 0, 'revenue': Decimal('0.00'),
+                             'new_customers': 0, 'items_sold': 0}
+            return rows[day]
+
+        for day, (order_count, revenue) in self.tail_orders.items():
+            if since is None or day >= since:
+                row = row_for(day)
+                row['order_count'] += order_count
+                row['revenue'] += revenue
+        for (day, _), quantity in self.tail_items.items():
+            if since is None or day >= since:
+                row_for(day)['items_sold'] += quantity
+        for day, count in self.tail_customers.items():
+            if since is None or day >= since:
+                row_for(day)['new_customers'] += count
+        return [rows[day] for day in sorted(rows)]
+
+    @cached_property
+    def daily(self):
+        return [
+            {'period': row['date'], 'order_count': row['order_count'], 'revenue': row['revenue']}
+            for row in self.days()
+            if row['order_count']
+        ]
+
+    @cached_property
+    def weekly(self):
+        weeks = {}
+        for bucket in self.daily:
+            week = weeks.setdefault(
+                week_start(bucket['period']),
+                {'period': week_start(bucket['period']), 'order_count': 0, 'revenue': Decimal('0.00')},
+            )
+            week['order_count'] += bucket['order_count']
+            week['revenue'] += bucket['revenue']
+        return [weeks[period] for period in sorted(weeks)]
+
+    def top_products(self, since, limit):
+        """``[(product_id, quantity)]`` sold most since ``since``."""
+        quantities = defaultdict(int)
+        for product_id, quantity in (
+            self.rolled(DailyProductSales).filter(date__gte=since)
+            .values_list('product_id')
+            .annotate(quantity=Sum('quantity'))
+        ):
+            quantities[product_id] += quantity
+        for (day, product_id), quantity in self.tail_items.items():
+            if day >= since:
+                quantities[product_id] += quantity
+        return sorted(quantities.items(), key=lambda item: (-item[1], item[0]))[:limit]
@@ -0,0 +1,120 @@
+"""
+Read-replica routing.
+
+``PrimaryReplicaRouter`` sends reads to one of ``CRM_READ_REPLICAS`` and
+everything else to ``default`` (the primary). Reads stay on the primary
+while
+
+- a transaction is open on it (``transaction.atomic`` blocks read what
+  they are about to write),
+- the current request is pinned: it ran a mutation or wrote anything
+  (reads after a write in the same request, e.g. a batched query after a
+  mutation), or
+- the client wrote within the last ``CRM_REPLICA_STICKY_SECONDS``:
+  ``ReplicaStickinessMiddleware`` sets a cookie after writing requests so
+  the next ones read their own writes despite replication lag.
+
+Only requests passing through the middleware use replicas: management
+commands, cron and Celery jobs and the ingestion thread write what they
+read, so they stay on the primary. With no replicas configured every
+query goes to ``default``.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICAS = list(getattr(settings, 'CRM_READ_REPLICAS', []))
+STICKY_SECONDS = getattr(settings, 'CRM_REPLICA_STICKY_SECONDS', 5)
+COOKIE = 'crm_primary'
+
+
+class RoutingState:
+    """Per-request routing flags; shared by threads the request runs on."""
+
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+
+
+routing_state = ContextVar('crm_routing_state', default=None)
+
+
+def pin_primary():
+    """Send the rest of the current request's reads to the primary."""
+    state = routing_state.get()
+    if state is not None:
+        state.primary = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not REPLICAS:
+            return None
+        state = routing_state.get()
+        if state is None or state.primary:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.primary = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in REPLICAS
+
+
+class ReplicaStickinessMiddleware:
+    """Pin clients to the primary for a while after they write.
+
+    Runs natively in both stacks: under ASGI a sync-only middleware would
+    funnel every request through one adapter thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        # Threads running the sync parts get a copy of this context, which
+        # shares the state object, so their writes are seen here
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        state = RoutingState(primary=bool(request.COOKIES.get(COOKIE)))
+        return state, routing_state.set(state)
+
+    def finish(self, state, response):
+        if state.wrote and REPLICAS:
+            response.set_cookie(COOKIE, '1', max_age=STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -1,13 +1,25 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
-from .models import Product, Order, Customer
-import re
+from datetime import timedelta
+from decimal import Decimal
+from .models import Product, Order, Customer, CustomerStats
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.utils import timezone
+from .fields import BatchedFilterConnectionField, filter_data, has_filter_args
+from . import ingest
+from .bulk import PHONE_PATTERN, bulk_create_customers
+from .inventory import LOW_STOCK_THRESHOLD, RESTOCK_AMOUNT, restock_low_stock
+from .orders import place_order
+from .loaders import get_loaders, prefetched
+from .optimizer import optimize_queryset
+from .pagination import KeysetConnectionField
+from .search import DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT, search
+from .rollups import RollupOrderStats
+from .stats import CRMStats, OrderStats, filtered_orders
 
 # Import filters when available
 try:
+    from graphene_django.filter.utils import get_filtering_args_from_filterset
     from .filters import CustomerFilter, ProductFilter, OrderFilter
     FILTERS_AVAILABLE = True
 except ImportError:
@@ -20,19 +32,160 @@ class ProductType(DjangoObjectType):
         filter_fields = ['name', 'price', 'stock']
         interfaces = (graphene.relay.Node, )
 
+    def resolve_order_set(self, info, **kwargs):
+        orders = prefetched(self, 'order_set')
+        if orders is not None:
+            return orders
+        return get_loaders(info).product_orders.load(self.id)
+
 class OrderType(DjangoObjectType):
+    products = BatchedFilterConnectionField(ProductType, required=True)
+
     class Meta:
         model = Order
         fields = "__all__"
         interfaces = (graphene.relay.Node, )
 
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info, **kwargs):
+        if has_filter_args(kwargs):
+            field = OrderType._meta.fields['products']
+            return get_loaders(info).filtered_order_products(
+                field.filterset_class, filter_data(field, kwargs), info.context
+            ).load(self.id)
+        products = prefetched(self, 'products')
+        if products is not None:
+            return products
+        return get_loaders(info).order_products.load(self.id)
+
+def customer_stats(customer, info):
+    """The customer's ``CustomerStats`` (None before the first order)."""
+    if not Customer.stats.is_cached(customer):
+        return get_loaders(info).customer_stats.load(customer.id)
+    try:
+        return customer.stats
+    except CustomerStats.DoesNotExist:
+        return None
+
 class CustomerType(DjangoObjectType):
+    # Maintained in CustomerStats (see crm/customer_stats.py)
+    order_count = graphene.Int(required=True)
+    lifetime_value = graphene.Decimal(required=True)
+    last_order_date = graphene.DateTime()
+
     class Meta:
         model = Customer
         fields = "__all__"
         filter_fields = ['name', 'email', 'created_at']
         interfaces = (graphene.relay.Node, )
 
+    def resolve_order_count(self, info):
+        stats = customer_stats(self, info)
+        return stats.order_count if stats else 0
+
+    def resolve_lifetime_value(self, info):
+        stats = customer_stats(self, info)
+        return stats.lifetime_value if stats else Decimal('0.00')
+
+    def resolve_last_order_date(self, info):
+        stats = customer_stats(self, info)
+        return stats.last_order_date if stats else None
+
+    def resolve_orders(self, info, **kwargs):
+        orders = prefetched(self, 'orders')
+        if orders is not None:
+            return orders
+        return get_loaders(info).customer_orders.load(self.id)
+
+# Reporting aggregates
+class StatsBucketType(graphene.ObjectType):
+    period = graphene.Date()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+class OrderStatsType(graphene.ObjectType):
+    order_count = graphene.Int()
+    total_revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+    daily = graphene.List(StatsBucketType)
+    weekly = graphene.List(StatsBucketType)
+
+class DailyRollupType(graphene.ObjectType):
+    date = graphene.Date()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    new_customers = graphene.Int()
+    items_sold = graphene.Int()
+
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    quantity = graphene.Int()
+
+class CRMStatsType(OrderStatsType):
+    customer_count = graphene.Int()
+    product_count = graphene.Int()
+    recent_days = graphene.List(DailyRollupType, days=graphene.Int(default_value=7))
+    top_products = graphene.List(
+        ProductSalesType,
+        days=graphene.Int(default_value=7),
+        first=graphene.Int(default_value=5)
+    )
+
+    def resolve_recent_days(self, info, days):
+        return self.days(since=timezone.localdate() - timedelta(days=days - 1))
+
+    def resolve_top_products(self, info, days, first):
+        top = self.top_products(timezone.localdate() - timedelta(days=days - 1), first)
+        products = Product.objects.in_bulk([product_id for product_id, _ in top])
+        return [
+            {'product': products[product_id], 'quantity': quantity}
+            for product_id, quantity in top
+            if product_id in products
+        ]
+
+# Full-text search
+class SearchKind(graphene.Enum):
+    CUSTOMER = 'customer'
+    PRODUCT = 'product'
+    ORDER = 'order'
+
+class SearchNode(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType, OrderType)
+
+class SearchHitType(graphene.ObjectType):
+    kind = SearchKind()
+    score = graphene.Float()
+    node = graphene.Field(SearchNode)
+
+# Write-behind ingestion (CRM_INGESTION)
+class IngestionStatus(graphene.Enum):
+    QUEUED = ingest.QUEUED
+    DONE = ingest.DONE
+    FAILED = ingest.FAILED
+
+class IngestionJobType(graphene.ObjectType):
+    job_id = graphene.ID()
+    kind = graphene.String()
+    status = IngestionStatus()
+    error = graphene.String()
+    customer = graphene.Field(CustomerType)
+    order = graphene.Field(OrderType)
+    
+    def resolve_customer(self, info):
+        if self['kind'] != 'customer' or self['object_id'] is None:
+            return None
+        return get_loaders(info).customer.load(self['object_id'])
+    
+    def resolve_order(self, info):
+        if self['kind'] != 'order' or self['object_id'] is None:
+            return None
+        return Order.objects.filter(pk=self['object_id']).first()
+
 # Task 1 & 2: Mutations
 class CreateCustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -45,16 +198,23 @@ class CreateCustomer(graphene.Mutation):
     
     customer = graphene.Field(CustomerType)
     message = graphene.String()
+    job_id = graphene.ID()
     
     def mutate(self, info, input):
+        if ingest.ingestion_queue is not None:
+            payload = ingest.customer_payload(input.name, input.email, input.phone)
+            return CreateCustomer(
+                job_id=ingest.ingestion_queue.submit(payload),
+                message="Customer queued"
+            )
+        
         # Validate email uniqueness
         if Customer.objects.filter(email=input.email).exists():
             raise ValidationError("Email already exists")
         
         # Validate phone format if provided
         if input.phone:
-            phone_pattern = r'^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$'
-            if not re.match(phone_pattern, input.phone):
+            if not PHONE_PATTERN.match(input.phone):
                 raise ValidationError("Invalid phone format")
         
         customer = Customer.objects.create(
@@ -70,6 +230,7 @@ class CreateCustomer(graphene.Mutation):
 
 class BulkCreateCustomersInput(graphene.InputObjectType):
     customers = graphene.List(CreateCustomerInput, required=True)
+    batch_size = graphene.Int()
 
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
@@ -77,37 +238,23 @@ class BulkCreateCustomers(graphene.Mutation):
     
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
+    created_count = graphene.Int()
+    elapsed_seconds = graphene.Float()
+    rows_per_second = graphene.Float()
     
     def mutate(self, info, input):
-        customers = []
-        errors = []
+        if input.batch_size is not None and input.batch_size <= 0:
+            raise ValidationError("Batch size must be positive")
         
-        with transaction.atomic():
-            for customer_input in input.customers:
-                try:
-                    # Validate email uniqueness
-                    if Customer.objects.filter(email=customer_input.email).exists():
-                        errors.append(f"Email {customer_input.email} already exists")
-                        continue
-                    
-                    # Validate phone format if provided
-                    if hasattr(customer_input, 'phone') and customer_input.phone:
-                        phone_pattern = r'^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$'
-                        if not re.match(phone_pattern, customer_input.phone):
-                            errors.append(f"Invalid phone format for {customer_input.name}")
-                            continue
-                    
-                    customer = Customer.objects.create(
-                        name=customer_input.name,
-                        email=customer_input.email,
-                        phone=getattr(customer_input, 'phone', '') or ''
-                    )
-                    customers.append(customer)
-                    
-                except Exception as e:
-                    errors.append(f"Error creating {customer_input.name}: {str(e)}")
+        result = bulk_create_customers(input.customers, batch_size=input.batch_size)
         
-        return BulkCreateCustomers(customers=customers, errors=errors)
+        return BulkCreateCustomers(
+            customers=result.customers,
+            errors=result.errors,
+            created_count=len(result.customers),
+            elapsed_seconds=result.elapsed,
+            rows_per_second=result.rows_per_second
+        )
 
 class CreateProductInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -137,9 +284,14 @@ class CreateProduct(graphene.Mutation):
         
         return CreateProduct(product=product)
 
+class OrderLineInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int()
+
 class CreateOrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.ID, required=True)
+    product_ids = graphene.List(graphene.ID)
+    items = graphene.List(OrderLineInput)
     order_date = graphene.DateTime()
 
 class CreateOrder(graphene.Mutation):
@@ -147,91 +299,149 @@ class CreateOrder(graphene.Mutation):
         input = CreateOrderInput(required=True)
     
     order = graphene.Field(OrderType)
+    job_id = graphene.ID()
     
     def mutate(self, info, input):
-        # Validate customer exists
-        try:
-            customer = Customer.objects.get(id=input.customer_id)
-        except Customer.DoesNotExist:
-            raise ValidationError("Invalid customer ID")
+        # productIds are shorthand for lines of quantity 1
+        lines = [(product_id, 1) for product_id in input.product_ids or []]
+        lines += [(item.product_id, item.quantity) for item in input.items or []]
         
-        # Validate products exist
-        if not input.product_ids:
-            raise ValidationError("At least one product must be selected")
+        if ingest.ingestion_queue is not None:
+            payload = ingest.order_payload(input.customer_id, lines, order_date=input.order_date)
+            return CreateOrder(job_id=ingest.ingestion_queue.submit(payload))
         
-        products = Product.objects.filter(id__in=input.product_ids)
-        if len(products) != len(input.product_ids):
-            raise ValidationError("Invalid product ID")
-        
-        # Calculate total amount
-        total_amount = sum(product.price for product in products)
-        
-        # Create order
-        order = Order.objects.create(
-            customer=customer,
-            total_amount=total_amount,
-            order_date=getattr(input, 'order_date', None)
-        )
-        
-        # Associate products with order through OrderItem
-        from .models import OrderItem
-        for product in products:
-            OrderItem.objects.create(order=order, product=product)
+        order = place_order(input.customer_id, lines, order_date=input.order_date)
         
         return CreateOrder(order=order)
 
 # Task 3: Update Low Stock Products (from cron project)
+def low_stock_arguments():
+    arguments = {
+        'threshold': graphene.Int(),
+        'increment': graphene.Int(),
+    }
+    if FILTERS_AVAILABLE:
+        arguments.update(get_filtering_args_from_filterset(ProductFilter, ProductType))
+    return arguments
+
 class UpdateLowStockProducts(graphene.Mutation):
-    class Arguments:
-        pass
+    class Meta:
+        arguments = low_stock_arguments()
     
     success = graphene.Boolean()
     message = graphene.String()
+    updated_count = graphene.Int()
     updated_products = graphene.List(ProductType)
     
-    def mutate(self, info):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
+    def mutate(self, info, threshold=None, increment=None, **filters):
+        threshold = LOW_STOCK_THRESHOLD if threshold is None else threshold
+        increment = RESTOCK_AMOUNT if increment is None else increment
+        if increment <= 0:
+            raise ValidationError("Increment must be positive")
         
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
+        queryset = Product.objects.all()
+        if filters:
+            filterset = ProductFilter(data=filters, queryset=queryset)
+            if not filterset.is_valid():
+                raise ValidationError(filterset.form.errors.as_json())
+            queryset = filterset.qs
+        
+        updated_ids = restock_low_stock(queryset, threshold=threshold, increment=increment)
         
         return UpdateLowStockProducts(
             success=True,
-            message=f"Updated {len(updated_products)} products",
-            updated_products=updated_products
+            message=f"Updated {len(updated_ids)} products",
+            updated_count=len(updated_ids),
+            updated_products=Product.objects.filter(pk__in=updated_ids)
         )
+    
+    def resolve_updated_products(self, info):
+        # Only fetched when the selection asks for it
+        return optimize_queryset(self.updated_products, info)
 
 class Query(graphene.ObjectType):
     hello = graphene.String()
     
     # Task 3: Filtered queries (when filters are available)
     if FILTERS_AVAILABLE:
-        all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-        all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-        all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+        all_customers = BatchedFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
+        all_products = BatchedFilterConnectionField(ProductType, filterset_class=ProductFilter)
+        all_orders = BatchedFilterConnectionField(OrderType, filterset_class=OrderFilter)
     
     # Simple list queries for compatibility
     customers = graphene.List(CustomerType)
     products = graphene.List(ProductType)
     orders = graphene.List(OrderType, order_date_gte=graphene.Date())
     
+    # Keyset-paginated connections for deep paging
+    if FILTERS_AVAILABLE:
+        paged_customers = KeysetConnectionField(CustomerType, ('created_at', 'id'), CustomerFilter)
+        paged_products = KeysetConnectionField(ProductType, ('id',), ProductFilter)
+        paged_orders = KeysetConnectionField(OrderType, ('order_date', 'id'), OrderFilter)
+    else:
+        paged_customers = KeysetConnectionField(CustomerType, ('created_at', 'id'))
+        paged_products = KeysetConnectionField(ProductType, ('id',))
+        paged_orders = KeysetConnectionField(OrderType, ('order_date', 'id'))
+    
+    search = graphene.List(
+        SearchHitType,
+        query=graphene.String(required=True),
+        types=graphene.List(SearchKind),
+        first=graphene.Int()
+    )
+    
+    # Aggregates computed in SQL
+    crm_stats = graphene.Field(CRMStatsType)
+    if FILTERS_AVAILABLE:
+        order_stats = graphene.Field(
+            OrderStatsType,
+            **get_filtering_args_from_filterset(OrderFilter, OrderType)
+        )
+    
+    # Jobs queued by createCustomer/createOrder under CRM_INGESTION
+    ingestion_status = graphene.Field(IngestionJobType, job_id=graphene.ID(required=True))
+    
     def resolve_hello(self, info):
         return "Hello, GraphQL!"
     
     def resolve_customers(self, info):
-        return Customer.objects.all()
+        customers = list(optimize_queryset(Customer.objects.all(), info))
+        get_loaders(info).prime(customers)
+        return customers
     
     def resolve_products(self, info):
-        return Product.objects.all()
+        products = list(optimize_queryset(Product.objects.all(), info))
+        get_loaders(info).prime(products)
+        return products
     
     def resolve_orders(self, info, order_date_gte=None):
         orders = Order.objects.all()
         if order_date_gte:
             orders = orders.filter(order_date__gte=order_date_gte)
+        orders = list(optimize_queryset(orders, info))
+        get_loaders(info).prime(orders)
         return orders
+    
+    def resolve_search(self, info, query, types=None, first=None):
+        kinds = [kind.value if hasattr(kind, 'value') else kind for kind in types] if types else None
+        hits = search(query, kinds=kinds, limit=DEFAULT_SEARCH_LIMIT if first is None else first)
+        get_loaders(info).prime(hit.node for hit in hits)
+        return hits
+    
+    def resolve_crm_stats(self, info):
+        return CRMStats()
+    
+    def resolve_ingestion_status(self, info, job_id):
+        return ingest.get_status(job_id)
+    
+    def resolve_order_stats(self, info, **kwargs):
+        if all(value in (None, '') for value in kwargs.values()):
+            # Every order: read the daily rollups
+            return RollupOrderStats()
+        filterset = OrderFilter(data=kwargs, queryset=Order.objects.all())
+        if not filterset.is_valid():
+            raise ValidationError(filterset.form.errors.as_json())
+        return OrderStats(filtered_orders(filterset))
 
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
@@ -0,0 +1,144 @@
+"""
+Ranked full-text search over customers, products and orders.
+
+On SQLite this queries the ``crm_search`` FTS5 table maintained by triggers
+(migration 0004); on PostgreSQL it matches ``to_tsvector`` expressions that
+have GIN indexes. Every search term is a prefix, so ``ali joh`` finds
+"Alice Johnson". Other backends fall back to ``icontains``.
+"""
+
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Customer, Order, Product
+
+SearchHit = namedtuple('SearchHit', ['kind', 'node', 'score'])
+
+KINDS = {
+    'customer': (1, Customer),
+    'product': (2, Product),
+    'order': (3, Order),
+}
+KIND_BY_CODE = {code: kind for kind, (code, model) in KINDS.items()}
+
+DEFAULT_LIMIT = 20
+
+POSTGRESQL_VECTORS = {
+    'customer': ('crm_customer', "coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, '')"),
+    'product': ('crm_product', "coalesce(name, '')"),
+}
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search(query, kinds=None, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` ``SearchHit``s for ``query``, best first."""
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    words = terms(query)
+    if not words or not kinds or limit <= 0:
+        return []
+
+    if connection.vendor == 'sqlite' and fts_available():
+        scored = sqlite_search(words, kinds, limit)
+    elif connection.vendor == 'postgresql':
+        scored = postgresql_search(words, kinds, limit)
+    else:
+        scored = fallback_search(words, kinds, limit)
+    return load_hits(scored)
+
+
+_fts_available = False
+
+
+def fts_available():
+    # Only a positive answer is cached: the migration may run later.
+    global _fts_available
+    if not _fts_available:
+        _fts_available = 'crm_search' in connection.introspection.table_names()
+    return _fts_available
+
+
+def sqlite_search(words, kinds, limit):
+    match = ' '.join('"%s"*' % word for word in words)
+    codes = ', '.join(str(KINDS[kind][0]) for kind in kinds)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, -bm25(crm_search) FROM crm_search
+            WHERE crm_search MATCH %s AND rowid %% 4 IN ({codes})
+            ORDER BY rank LIMIT %s
+            """,
+            [match, limit],
+        )
+        return [(KIND_BY_CODE[rowid % 4], rowid // 4, score) for rowid, score in cursor.fetchall()]
+
+
+def postgresql_search(words, kinds, limit):
+    tsquery = ' & '.join(f'{word}:*' for word in words)
+    scored = []
+    with connection.cursor() as cursor:
+        for kind in kinds:
+            if kind == 'order':
+                # Orders are found through their customer's vector
+                table, vector = POSTGRESQL_VECTORS['customer']
+                cursor.execute(
+                    f"""
+                    SELECT o.id, ts_rank(to_tsvector('simple', {vector}), q) AS score
+                    FROM crm_order o JOIN {table} ON {table}.id = o.customer_id,
+                         to_tsquery('simple', %s) q
+                    WHERE to_tsvector('simple', {vector}) @@ q
+                    ORDER BY score DESC LIMIT %s
+                    """,
+                    [tsquery, limit],
+                )
+            else:
+                table, vector = POSTGRESQL_VECTORS[kind]
+                cursor.execute(
+                    f"""
+                    SELECT id, ts_rank(to_tsvector('simple', {vector}), q) AS score
+                    FROM {table}, to_tsquery('simple', %s) q
+                    WHERE to_tsvector('simple', {vector}) @@ q
+                    ORDER BY score DESC LIMIT %s
+                    """,
+                    [tsquery, limit],
+                )
+            scored.extend((kind, pk, score) for pk, score in cursor.fetchall())
+    scored.sort(key=lambda hit: hit[2], reverse=True)
+    return scored[:limit]
+
+
+def fallback_search(words, kinds, limit):
+    fields = {
+        'customer': ['name', 'email'],
+        'product': ['name'],
+        'order': ['customer__name', 'customer__email'],
+    }
+    scored = []
+    for kind in kinds:
+        condition = Q()
+        for word in words:
+            any_field = Q()
+            for field in fields[kind]:
+                any_field |= Q(**{f'{field}__icontains': word})
+            condition &= any_field
+        pks = KINDS[kind][1].objects.filter(condition).values_list('pk', flat=True)[:limit]
+        scored.extend((kind, pk, 1.0) for pk in pks)
+    return scored[:limit]
+
+
+def load_hits(scored):
+    """Fetch the matched objects with one query per kind, keeping the ranking."""
+    ids = {}
+    for kind, pk, score in scored:
+        ids.setdefault(kind, []).append(pk)
+    objects = {kind: KINDS[kind][1].objects.in_bulk(pks) for kind, pks in ids.items()}
+    return [
+        SearchHit(kind, objects[kind][pk], score)
+        for kind, pk, score in scored
+        if pk in objects[kind]
+    ]
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Outermost so every write of the request (sessions included) counts
+    'crm.routers.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,18 +61,98 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'crm.wsgi.application'
+ASGI_APPLICATION = 'crm.asgi.application'
 
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
-DATABASES = {
-    'default': {
+# Also list every restocked product in the low-stock log (one extra query)
+CRM_LOW_STOCK_LOG_PRODUCTS = os.environ.get('CRM_LOW_STOCK_LOG_PRODUCTS') == '1'
+
+# Seconds a connection is kept open across requests (0 closes it after
+# each request); CRM_DB_POOL=1 uses psycopg's pool on PostgreSQL instead
+CRM_DB_CONN_MAX_AGE = int(os.environ.get('CRM_DB_CONN_MAX_AGE', 60))
+CRM_DB_POOL = os.environ.get('CRM_DB_POOL') == '1'
+
+# SQLite tuning for web traffic alongside cron/Celery writers (see
+# "SQLite Tuning" in crm/README.md); CRM_SQLITE_TUNING=0 keeps SQLite's
+# defaults. Pragmas run on every new connection.
+CRM_SQLITE_TUNING = os.environ.get('CRM_SQLITE_TUNING', '1') != '0'
+CRM_SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, nor the writer readers
+    'journal_mode': 'WAL',
+    # Durable across crashes in WAL mode; fsyncs only at checkpoints
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative: KiB, i.e. 64 MiB of page cache per connection
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Seconds a connection waits for the write lock before "database is locked"
+CRM_SQLITE_BUSY_TIMEOUT = float(os.environ.get('CRM_SQLITE_BUSY_TIMEOUT', 20))
+
+
+def sqlite_options(tuned=CRM_SQLITE_TUNING):
+    if not tuned:
+        return {}
+    return {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in CRM_SQLITE_PRAGMAS.items()),
+        'timeout': CRM_SQLITE_BUSY_TIMEOUT,
+        # Take the write lock when a transaction starts, where the busy
+        # timeout applies, rather than failing when a read upgrades to a write
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+
+def sqlite_database(path):
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': CRM_DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': sqlite_options(),
     }
+
+
+def postgres_database(host):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['CRM_POSTGRES_DB'],
+        'HOST': host,
+        'PORT': os.environ.get('PGPORT', '5432'),
+        'USER': os.environ.get('PGUSER', ''),
+        'PASSWORD': os.environ.get('PGPASSWORD', ''),
+        # A pool and persistent connections are mutually exclusive
+        'CONN_MAX_AGE': 0 if CRM_DB_POOL else CRM_DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'pool': True} if CRM_DB_POOL else {},
+    }
+
+
+# SQLite (db.sqlite3) unless CRM_POSTGRES_DB names a PostgreSQL database
+# on PGHOST. CRM_DB_REPLICAS lists read replicas, comma-separated: SQLite
+# files or PostgreSQL hosts (see crm/routers.py).
+if os.environ.get('CRM_POSTGRES_DB'):
+    database = postgres_database
+    PRIMARY_DATABASE = os.environ.get('PGHOST', 'localhost')
+else:
+    database = sqlite_database
+    PRIMARY_DATABASE = BASE_DIR / 'db.sqlite3'
+
+DATABASES = {
+    'default': database(PRIMARY_DATABASE),
 }
+CRM_READ_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('CRM_DB_REPLICAS', '').split(','))):
+    alias = f'replica{index + 1}'
+    DATABASES[alias] = dict(database(replica.strip()), TEST={'MIRROR': 'default'})
+    CRM_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['crm.routers.PrimaryReplicaRouter']
+# Reads of a client that just wrote stay on the primary this long
+CRM_REPLICA_STICKY_SECONDS = 5
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,6 +182,100 @@ GRAPHENE = {
     'SCHEMA': 'schema.schema'
 }
 
+# Parsed/validated GraphQL documents kept in memory (see crm/persisted.py)
+CRM_DOCUMENT_CACHE_SIZE = 500
+# Optional JSON manifest {sha256: query} of persisted queries
+CRM_PERSISTED_QUERIES = os.environ.get('CRM_PERSISTED_QUERIES')
+# Only execute documents listed in the manifest
+CRM_PERSISTED_QUERIES_ONLY = False
+
+# Cache shared by every web worker, cron/Celery job and management command
+# (e.g. redis://localhost:6379/1). Without it each process gets Django's
+# in-memory cache, which other processes can neither read nor invalidate.
+CRM_CACHE_URL = os.environ.get('CRM_CACHE_URL')
+if CRM_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CRM_CACHE_URL,
+        },
+    }
+
+# Read-query response cache (see crm/response_cache.py): 'local', 'django'
+# or '' to disable. 'local' only sees its own process's writes.
+CRM_RESPONSE_CACHE_BACKEND = os.environ.get(
+    'CRM_RESPONSE_CACHE_BACKEND', 'django' if CRM_CACHE_URL else 'local'
+) or None
+CRM_RESPONSE_CACHE_ALIAS = 'default'
+CRM_RESPONSE_CACHE_SIZE = 1000
+CRM_RESPONSE_CACHE_TTL = 60
+
+# Operations accepted in one JSON array POST to /graphql
+CRM_GRAPHQL_MAX_BATCH_SIZE = 20
+
+# Resolver/SQL tracing (see crm/tracing.py)
+CRM_TRACING = True
+CRM_TRACING_HEADER = 'X-CRM-Trace'
+CRM_TRACING_N_PLUS_ONE = 5
+CRM_TRACING_WINDOW = 500
+CRM_TRACING_SLOW_MS = 500
+
+# Rows fetched per round trip by the streaming exports (see crm/export.py)
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Days recomputed per transaction by the daily rollups, and days behind
+# the last rolled-up one recomputed on every run (see crm/rollups.py)
+CRM_ROLLUP_CHUNK_DAYS = 31
+CRM_ROLLUP_LAG_DAYS = 2
+
+# How cron/Celery jobs run GraphQL (see crm/jobs.py): 'local' executes in
+# the job's own process; 'http' posts to CRM_JOB_GRAPHQL_URL
+CRM_JOB_TRANSPORT = os.environ.get('CRM_JOB_TRANSPORT', 'local')
+CRM_JOB_GRAPHQL_URL = os.environ.get('CRM_JOB_GRAPHQL_URL', 'http://localhost:8000/graphql')
+CRM_JOB_HTTP_TIMEOUT = 30
+
+# Write-behind ingestion of createCustomer/createOrder (see crm/ingest.py):
+# None writes synchronously; 'thread' commits micro-batches in-process;
+# 'celery' sends them to crm.tasks.ingest_batch
+CRM_INGESTION = os.environ.get('CRM_INGESTION') or None
+CRM_INGESTION_BATCH_SIZE = 500
+CRM_INGESTION_MAX_WAIT = 0.05
+CRM_INGESTION_QUEUE_SIZE = 100000
+# Job statuses for ingestionStatus; must be a cache shared by all web and
+# Celery workers (CRM_CACHE_URL)
+CRM_INGESTION_CACHE_ALIAS = 'default'
+CRM_INGESTION_STATUS_TTL = 3600
+
+# Inactive-customer cleanup (see crm/cleanup.py): customers deleted per
+# transaction and seconds paused between batches
+CRM_CLEANUP_BATCH_SIZE = 1000
+CRM_CLEANUP_SLEEP = 0.1
+
+# Order reminders (see crm/reminders.py): 'file', 'console' or a dotted
+# backend class path; sends per second (None: unlimited) on a bounded pool
+CRM_REMINDER_BACKEND = os.environ.get('CRM_REMINDER_BACKEND', 'file')
+CRM_REMINDER_LOG_FILE = '/tmp/order_reminders_log.txt'
+CRM_REMINDER_WINDOW_DAYS = 7
+CRM_REMINDER_BATCH_SIZE = 500
+CRM_REMINDER_WORKERS = 8
+CRM_REMINDER_RATE = 50
+
+# Customers recomputed per transaction by rebuild_customer_stats
+# (see crm/customer_stats.py)
+CRM_CUSTOMER_STATS_CHUNK_SIZE = 5000
+
+# Query limits (see crm/cost.py); None disables a limit
+CRM_QUERY_MAX_COST = 10000
+CRM_QUERY_MAX_DEPTH = 15
+CRM_QUERY_DEFAULT_LIST_SIZE = 100
+# Rows per parent assumed for unpaginated lists/connections under a list
+CRM_QUERY_DEFAULT_NESTED_SIZE = 10
+
+# Set by crm/asgi.py: serve /graphql with the async view
+CRM_ASYNC_GRAPHQL = os.environ.get('CRM_ASYNC_GRAPHQL') == '1'
+# Worker threads (and database connections) for async GraphQL execution
+CRM_ASYNC_WORKERS = int(os.environ.get('CRM_ASYNC_WORKERS', 16))
+
 # Celery Configuration
 if CELERY_AVAILABLE:
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -114,4 +290,8 @@ if CELERY_AVAILABLE:
             'task': 'crm.tasks.generate_crm_report',
             'schedule': crontab(day_of_week='mon', hour=6, minute=0),
         },
+        'update-daily-rollups': {
+            'task': 'crm.tasks.update_daily_rollups',
+            'schedule': crontab(minute=5),
+        },
     }
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .customer_stats import forget_order
+from .models import Order
+from .response_cache import CACHED_MODELS, invalidate
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    if sender in CACHED_MODELS:
+        invalidate(sender)
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_customer_stats(sender, instance, **kwargs):
+    forget_order(instance)
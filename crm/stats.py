@@ -0,0 +1,97 @@
+"""
+SQL-side aggregates for CRM reporting.
+
+``OrderStats`` wraps an ``Order`` queryset and computes counts, revenue and
+per-day/per-week buckets with ``Count``/``Sum``/``Trunc*`` aggregates, so
+callers never have to download individual orders to total them. Unfiltered
+statistics (``CRMStats``) read the daily rollups of ``crm.rollups`` instead.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Avg, Count, DateField, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncWeek
+from django.utils.functional import cached_property
+
+from .models import Customer, Order, Product
+from .rollups import RollupOrderStats, cents
+
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+class OrderStats:
+    """Aggregates over a (possibly filtered) ``Order`` queryset."""
+
+    def __init__(self, queryset=None):
+        self.queryset = Order.objects.all() if queryset is None else queryset
+
+    @cached_property
+    def totals(self):
+        totals = self.queryset.order_by().aggregate(
+            order_count=Count('id'),
+            total_revenue=Coalesce(Sum('total_amount'), ZERO),
+            average_order_value=Avg('total_amount'),
+        )
+        # Same cents as the rollups, whatever precision the backend sums in
+        totals['total_revenue'] = cents(totals['total_revenue'])
+        if totals['average_order_value'] is not None:
+            totals['average_order_value'] = cents(totals['average_order_value'])
+        return totals
+
+    @property
+    def order_count(self):
+        return self.totals['order_count']
+
+    @property
+    def total_revenue(self):
+        return self.totals['total_revenue']
+
+    @property
+    def average_order_value(self):
+        return self.totals['average_order_value']
+
+    def buckets(self, trunc):
+        """Order count and revenue grouped by a truncated ``order_date``."""
+        rows = list(
+            self.queryset.order_by()
+            .annotate(period=trunc)
+            .values('period')
+            .annotate(order_count=Count('id'), revenue=Coalesce(Sum('total_amount'), ZERO))
+            .order_by('period')
+        )
+        for row in rows:
+            row['revenue'] = cents(row['revenue'])
+        return rows
+
+    @cached_property
+    def daily(self):
+        return self.buckets(TruncDate('order_date'))
+
+    @cached_property
+    def weekly(self):
+        return self.buckets(TruncWeek('order_date', output_field=DateField()))
+
+
+class CRMStats(RollupOrderStats):
+    """Order aggregates (from the daily rollups) plus customer and product totals."""
+
+    @cached_property
+    def customer_count(self):
+        return Customer.objects.count()
+
+    @cached_property
+    def product_count(self):
+        return Product.objects.count()
+
+
+def filtered_orders(filterset):
+    """Orders matched by an ``OrderFilter``, safe to aggregate.
+
+    Product filters join through ``OrderItem`` and can repeat an order once
+    per matching line, so those are collapsed with an ``id IN`` subquery.
+    """
+    queryset = filterset.qs
+    cleaned = filterset.form.cleaned_data
+    if any(cleaned.get(name) not in (None, '') for name in ('product_name', 'product_id')):
+        queryset = Order.objects.filter(pk__in=queryset.values('pk'))
+    return queryset
@@ -1,42 +1,57 @@
 from datetime import datetime
 
+from .jobs import run_query
+from .rollups import update_rollups
+
 try:
     from celery import shared_task
-    from gql import gql, Client
-    from gql.transport.requests import RequestsHTTPTransport
     
     @shared_task
     def generate_crm_report():
-        query = gql("""
+        query = """
         query GetCRMStats {
-            customers {
-                id
-            }
-            orders {
-                id
-                totalAmount
+            crmStats {
+                customerCount
+                orderCount
+                totalRevenue
+                recentDays(days: 7) {
+                    date
+                    orderCount
+                    revenue
+                    newCustomers
+                    itemsSold
+                }
+                topProducts(days: 7, first: 5) {
+                    product {
+                        name
+                    }
+                    quantity
+                }
             }
         }
-        """)
+        """
         
         try:
-            transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-            client = Client(transport=transport)
-            
-            result = client.execute(query)
+            result = run_query(query)
             
-            customers = result.get('customers', [])
-            orders = result.get('orders', [])
+            stats = result.get('crmStats') or {}
             
-            total_customers = len(customers)
-            total_orders = len(orders)
-            total_revenue = sum(float(order.get('totalAmount', 0)) for order in orders)
+            total_customers = stats.get('customerCount', 0)
+            total_orders = stats.get('orderCount', 0)
+            total_revenue = float(stats.get('totalRevenue') or 0)
             
             timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             report = f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, {total_revenue} revenue"
             
             with open('/tmp/crm_report_log.txt', 'a') as log_file:
                 log_file.write(report + '\n')
+                for day in stats.get('recentDays') or []:
+                    log_file.write(
+                        f"    {day['date']}: {day['orderCount']} orders, {float(day['revenue'])} revenue, "
+                        f"{day['newCustomers']} new customers, {day['itemsSold']} items sold\n"
+                    )
+                for sales in stats.get('topProducts') or []:
+                    log_file.write(f"    top product: {sales['product']['name']} ({sales['quantity']} sold)\n")
             
             print(f"CRM Report generated: {report}")
             return report
@@ -46,8 +61,28 @@ try:
             print(error_msg)
             return error_msg
 
+    @shared_task
+    def update_daily_rollups():
+        totals = update_rollups()
+        return f"Rolled up {totals['orders']} orders, {totals['customers']} customers"
+
+    @shared_task
+    def ingest_batch(payloads):
+        from .ingest import process_batch
+        statuses = process_batch(payloads)
+        return f"Ingested {sum(s['status'] == 'done' for s in statuses)} of {len(payloads)}"
+
 except ImportError:
     # Celery not available, define a regular function
     def generate_crm_report():
         print("Celery not available - this would be a Celery task")
         return "Celery not installed"
+
+    def update_daily_rollups():
+        totals = update_rollups()
+        return f"Rolled up {totals['orders']} orders, {totals['customers']} customers"
+
+    def ingest_batch(payloads):
+        from .ingest import process_batch
+        statuses = process_batch(payloads)
+        return f"Ingested {sum(s['status'] == 'done' for s in statuses)} of {len(payloads)}"
@@ -0,0 +1,519 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipIf
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from graphql import parse, validate
+
+from . import ingest
+from .bulk import bulk_create_customers
+from .cleanup import delete_inactive_customers
+from .cost import MAX_COST, QueryCostError, check_cost
+from .models import Customer, CustomerStats, Order, OrderItem, Product, ReminderLog
+from .orders import place_order
+from .persisted import DocumentCache, document_cache, query_hash
+from .reminders import dispatch_reminders
+from .response_cache import response_cache
+from .rollups import RollupOrderStats, update_rollups
+from .routers import COOKIE
+from .schema import schema
+
+
+def graphql(client, query, variables=None):
+    response = client.post(
+        '/graphql', json.dumps({'query': query, 'variables': variables or {}}),
+        content_type='application/json',
+    )
+    body = json.loads(response.content)
+    assert not body.get('errors'), body['errors']
+    return body['data']
+
+
+async def slow_view(request):
+    await asyncio.sleep(0.2)
+    return HttpResponse()
+
+
+async def writing_view(request):
+    await Customer.objects.acreate(name='Async', email='async@example.com')
+    return HttpResponse()
+
+
+# ROOT_URLCONF of the middleware tests
+urlpatterns = [
+    path('slow', slow_view),
+    path('write', writing_view),
+]
+
+
+class CRMTestCase(TestCase):
+    def setUp(self):
+        if response_cache is not None:
+            # Entries outlive the rolled-back test transactions
+            response_cache.backend.clear()
+
+
+class QueryCostTests(SimpleTestCase):
+    # Shapes existing clients send; they must stay under the default budget
+    BASELINE_QUERIES = [
+        '{ orders { id customer { email } products { edges { node { name } } } } }',
+        '{ orders { id products(name: "Laptop") { edges { node { name } } } } }',
+        '{ allOrders { edges { node { id products { edges { node { name } } } } } } }',
+        '{ allCustomers(first: 50) { edges { node { name email } } } }',
+        '{ crmStats { customerCount orderCount totalRevenue } }',
+    ]
+
+    def cost(self, query):
+        document = parse(query)
+        self.assertEqual(validate(schema.graphql_schema, document), [])
+        return check_cost(schema.graphql_schema, document)
+
+    def test_baseline_queries_fit_the_default_budget(self):
+        for query in self.BASELINE_QUERIES:
+            with self.subTest(query=query):
+                self.assertLessEqual(self.cost(query), MAX_COST)
+
+    def test_nested_connection_under_list_uses_nested_size(self):
+        self.assertEqual(
+            self.cost('{ orders { id customer { email } products { edges { node { name } } } } }'), 1300
+        )
+
+    def test_explicit_page_sizes_are_multiplied(self):
+        with self.assertRaises(QueryCostError):
+            self.cost(
+                '{ allOrders(first: 100) { edges { node { id '
+                'products(first: 100) { edges { node { name } } } } } } }'
+            )
+
+
+class PersistedQueryTests(CRMTestCase):
+    QUERY = '{ hello }'
+
+    def setUp(self):
+        super().setUp()
+        document_cache.clear()
+
+    def post(self, **body):
+        response = self.client.post('/graphql', json.dumps(body), content_type='application/json')
+        return json.loads(response.content)
+
+    def persisted(self, sha256_hash):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}}
+
+    def test_unknown_hash_asks_for_the_query(self):
+        body = self.post(extensions=self.persisted(query_hash(self.QUERY)))
+        self.assertEqual(body['errors'][0]['message'], 'PersistedQueryNotFound')
+
+    def test_hash_is_usable_once_registered(self):
+        sha256_hash = query_hash(self.QUERY)
+        self.post(query=self.QUERY, extensions=self.persisted(sha256_hash))
+        body = self.post(extensions=self.persisted(sha256_hash))
+        self.assertEqual(body['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_mismatched_hash_is_rejected(self):
+        body = self.post(query=self.QUERY, extensions=self.persisted(query_hash('{ other }')))
+        self.assertEqual(body['errors'][0]['message'], 'provided sha does not match query')
+
+    def test_documents_are_parsed_once(self):
+        cache = DocumentCache(max_size=1)
+        first, errors = cache.get_document(schema.graphql_schema, self.QUERY)
+        self.assertEqual(errors, [])
+        self.assertIs(cache.get_document(schema.graphql_schema, self.QUERY)[0], first)
+        cache.get_document(schema.graphql_schema, '{ customers { id } }')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertIsNot(cache.get_document(schema.graphql_schema, self.QUERY)[0], first)
+
+
+@skipIf(response_cache is None, 'CRM_RESPONSE_CACHE_BACKEND is disabled')
+class ResponseCacheTests(CRMTestCase):
+    QUERY = '{ customers { name } }'
+
+    def setUp(self):
+        super().setUp()
+        Customer.objects.create(name='Ann', email='ann@example.com')
+
+    def names(self):
+        return [customer['name'] for customer in graphql(self.client, self.QUERY)['customers']]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.assertEqual(self.names(), ['Ann'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Ann'])
+
+    def test_write_to_a_read_model_invalidates(self):
+        self.names()
+        Customer.objects.create(name='Bob', email='bob@example.com')
+        self.assertEqual(self.names(), ['Ann', 'Bob'])
+
+    def test_write_to_another_model_keeps_the_entry(self):
+        self.names()
+        Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=1)
+        with self.assertNumQueries(0):
+            self.names()
+
+    def test_mutations_are_not_cached(self):
+        mutation = 'mutation { createCustomer(input: {name: "Cy", email: "cy@example.com"}) { message } }'
+        graphql(self.client, mutation)
+        # Executed again rather than replayed
+        response = self.client.post('/graphql', json.dumps({'query': mutation}), content_type='application/json')
+        self.assertEqual(json.loads(response.content)['errors'][0]['message'], 'Email already exists')
+        self.assertEqual(self.names(), ['Ann', 'Cy'])
+
+
+class CustomerStatsFilterTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        product = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=10)
+        self.buyer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        # Never ordered: no CustomerStats row
+        self.newcomer = Customer.objects.create(name='Newcomer', email='newcomer@example.com')
+        place_order(self.buyer.pk, [(product.pk, 1)])
+
+    def names(self, arguments):
+        data = graphql(self.client, f'{{ allCustomers({arguments}) {{ edges {{ node {{ name orderCount }} }} }} }}')
+        return [edge['node']['name'] for edge in data['allCustomers']['edges']]
+
+    def test_customers_without_orders_filter_as_zero(self):
+        self.assertEqual(self.names('orderCount_Lte: 0'), ['Newcomer'])
+        self.assertEqual(self.names('lifetimeValue_Lte: 1'), ['Newcomer'])
+        self.assertEqual(self.names('orderCount_Gte: 1'), ['Buyer'])
+
+    def test_customers_without_orders_sort_as_zero(self):
+        self.assertEqual(self.names('orderBy: "order_count"'), ['Newcomer', 'Buyer'])
+        self.assertEqual(self.names('orderBy: "-lifetime_value"'), ['Buyer', 'Newcomer'])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def order(self, total, **kwargs):
+        return Order.objects.create(customer=self.customer, total_amount=Decimal(total),
+                                    order_date=self.yesterday, **kwargs)
+
+    def test_late_commit_below_rolled_ids_is_counted(self):
+        self.order('10.00', pk=100)
+        update_rollups()
+        # Committed after the rollup although its id is lower
+        self.order('5.00', pk=50)
+        update_rollups()
+        stats = RollupOrderStats()
+        self.assertEqual(stats.order_count, 2)
+        self.assertEqual(stats.total_revenue, Decimal('15.00'))
+
+    def test_totals_are_quantized_to_cents(self):
+        for total in ('10.00', '10.00', '10.01'):
+            self.order(total)
+        update_rollups()
+        Order.objects.create(customer=self.customer, total_amount=Decimal('0.10'))
+        stats = RollupOrderStats()
+        self.assertEqual(str(stats.total_revenue), '30.11')
+        self.assertEqual(str(stats.average_order_value), '7.53')
+
+
+class OrderStatsTests(CRMTestCase):
+    QUERY = """{ orderStats%s {
+        orderCount totalRevenue averageOrderValue daily { period orderCount revenue }
+    } }"""
+
+    def setUp(self):
+        super().setUp()
+        customer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        yesterday = timezone.now() - timedelta(days=1)
+        for total in ('10.00', '10.01'):
+            Order.objects.create(customer=customer, total_amount=Decimal(total), order_date=yesterday)
+        update_rollups()
+
+    def test_filtered_stats_match_rollups(self):
+        rolled = graphql(self.client, self.QUERY % '')['orderStats']
+        filtered = graphql(self.client, self.QUERY % '(totalAmount_Gte: 0)')['orderStats']
+        self.assertEqual(filtered, rolled)
+        # 10.005 rounds half up
+        self.assertEqual(filtered['averageOrderValue'], '10.01')
+        self.assertEqual(filtered['daily'][0]['revenue'], '20.01')
+
+
+class NestedOrderQueryTests(CRMTestCase):
+    QUERY = """{ orders { id customer { email } products%s { edges { node { name price } } } } }"""
+
+    def setUp(self):
+        super().setUp()
+        products = [
+            Product.objects.create(name=name, price=Decimal(price), stock=100)
+            for name, price in (('Laptop', '999.99'), ('Mouse', '19.99'), ('Phone', '499.00'))
+        ]
+        for index in range(20):
+            customer = Customer.objects.create(name=f'Customer {index}', email=f'c{index}@example.com')
+            lines = [(product.pk, 1) for product in products[:index % 3 + 1]]
+            place_order(customer.pk, lines)
+
+    def run_query(self, arguments=''):
+        return graphql(self.client, self.QUERY % arguments)['orders']
+
+    def test_unfiltered_products_query_count(self):
+        # Orders with their customers, then every order's products
+        with self.assertNumQueries(2):
+            orders = self.run_query()
+        self.assertEqual(len(orders), 20)
+        self.assertEqual(sum(len(order['products']['edges']) for order in orders), 39)
+
+    def test_filtered_products_are_batched(self):
+        with self.assertNumQueries(2):
+            orders = self.run_query('(name: "Mouse")')
+        names = [[edge['node']['name'] for edge in order['products']['edges']] for order in orders]
+        self.assertEqual(sum(names, []), ['Mouse'] * 13)
+        self.assertTrue(all(name == [] for name in names[::3]))
+
+    def test_filtered_products_under_customer_orders_are_batched(self):
+        query = """{ customers { orders(first: 5) { edges { node {
+            products(name: "Mouse", first: 5) { edges { node { name } } }
+        } } } } }"""
+        # Customers with their orders, then one filtered products batch
+        with self.assertNumQueries(3):
+            customers = graphql(self.client, query)['customers']
+        names = [
+            edge['node']['name']
+            for customer in customers
+            for order in customer['orders']['edges']
+            for edge in order['node']['products']['edges']
+        ]
+        self.assertEqual(names, ['Mouse'] * 13)
+
+
+class OrderPlacementTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        self.laptop = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=5)
+        self.mouse = Product.objects.create(name='Mouse', price=Decimal('25.50'), stock=5)
+
+    def test_lines_are_merged_and_priced_by_quantity(self):
+        mutation = """mutation($input: CreateOrderInput!) {
+            createOrder(input: $input) { order { totalAmount } }
+        }"""
+        data = graphql(self.client, mutation, {'input': {
+            'customerId': self.customer.pk,
+            'productIds': [self.mouse.pk],
+            'items': [
+                {'productId': self.laptop.pk, 'quantity': 2},
+                {'productId': self.mouse.pk},
+                {'productId': self.laptop.pk, 'quantity': 1},
+            ],
+        }})
+        self.assertEqual(Decimal(data['createOrder']['order']['totalAmount']), Decimal('3050.97'))
+        self.assertEqual(
+            dict(OrderItem.objects.values_list('product__name', 'quantity')),
+            {'Laptop': 3, 'Mouse': 2},
+        )
+        self.laptop.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.assertEqual((self.laptop.stock, self.mouse.stock), (2, 3))
+
+    def test_insufficient_stock_rejects_the_whole_order(self):
+        with self.assertRaisesMessage(ValidationError, 'Insufficient stock for Laptop'):
+            place_order(self.customer.pk, [(self.mouse.pk, 1), (self.laptop.pk, 6)])
+        self.assertFalse(Order.objects.exists())
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 5)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        keyboard = Product.objects.create(name='Keyboard', price=Decimal('45.00'), stock=5)
+        with CaptureQueriesContext(connection) as single:
+            place_order(self.customer.pk, [(self.laptop.pk, 1)])
+        with self.assertNumQueries(len(single)):
+            place_order(self.customer.pk, [(self.laptop.pk, 1), (self.mouse.pk, 2), (keyboard.pk, 1)])
+
+
+class BulkCreateCustomersTests(TestCase):
+    def row(self, name, email, phone=None):
+        return SimpleNamespace(name=name, email=email, phone=phone)
+
+    def test_errors_follow_input_order_after_a_race(self):
+        Customer.objects.create(name='Racer', email='racer@example.com')
+        rows = [
+            self.row('Racer', 'racer@example.com'),
+            self.row('Ann', 'ann@example.com'),
+            self.row('Bob', 'bob@example.com', phone='12345'),
+        ]
+        # The existing email is inserted concurrently, after validation
+        with mock.patch('crm.bulk.existing_emails', return_value=set()):
+            result = bulk_create_customers(rows)
+        self.assertEqual([customer.name for customer in result.customers], ['Ann'])
+        self.assertEqual(len(result.errors), 2)
+        self.assertTrue(result.errors[0].startswith('Error creating Racer'))
+        self.assertEqual(result.errors[1], 'Invalid phone format for Bob')
+
+
+class InactiveCustomerCleanupTests(TestCase):
+    def setUp(self):
+        for index in range(5):
+            Customer.objects.create(name=f'Idle {index}', email=f'idle{index}@example.com')
+        self.buyer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        product = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=10)
+        place_order(self.buyer.pk, [(product.pk, 1)])
+        Customer.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.recent = Customer.objects.create(name='Recent', email='recent@example.com')
+
+    def test_deletes_inactive_customers_in_batches(self):
+        result = delete_inactive_customers(days=365, batch_size=2, sleep=0)
+        self.assertEqual((result.deleted, result.batches), (5, 3))
+        self.assertEqual(set(Customer.objects.values_list('name', flat=True)), {'Buyer', 'Recent'})
+        self.assertTrue(CustomerStats.objects.filter(customer=self.buyer).exists())
+
+    def test_dry_run_deletes_nothing(self):
+        out = io.StringIO()
+        call_command('clean_inactive_customers', '--dry-run', '--batch-size', '2', '--sleep', '0', stdout=out)
+        self.assertIn('Would delete 5 inactive customers in 3 batches', out.getvalue())
+        self.assertEqual(Customer.objects.count(), 7)
+
+
+class IngestionTests(CRMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        self.product = Product.objects.create(name='Laptop', price=Decimal('999.99'), stock=1)
+
+    def submitted(self, *payloads):
+        return [dict(payload, job_id=f'job-{index}') for index, payload in enumerate(payloads)]
+
+    def test_batch_commits_valid_payloads_and_records_statuses(self):
+        payloads = self.submitted(
+            ingest.customer_payload('Ann', 'ann@example.com'),
+            ingest.customer_payload('Ann again', 'ann@example.com'),
+            ingest.customer_payload('Buyer', 'buyer@example.com'),
+            ingest.order_payload(self.customer.pk, [(self.product.pk, 1)]),
+            ingest.order_payload(self.customer.pk, [(self.product.pk, 1)]),
+        )
+        ingest.process_batch(payloads)
+        statuses = [ingest.get_status(payload['job_id']) for payload in payloads]
+        self.assertEqual([status['status'] for status in statuses],
+                         [ingest.DONE, ingest.FAILED, ingest.FAILED, ingest.DONE, ingest.FAILED])
+        self.assertEqual(statuses[4]['error'], 'Insufficient stock for Laptop')
+        self.assertEqual(Customer.objects.get(pk=statuses[0]['object_id']).email, 'ann@example.com')
+        self.assertEqual(Order.objects.get().pk, statuses[3]['object_id'])
+
+    def test_queue_coalesces_payloads_into_micro_batches(self):
+        batches = []
+        queue = ingest.IngestionQueue(batches.append, batch_size=2, max_wait=0.3)
+        for index in range(5):
+            queue.submit({'kind': 'customer', 'index': index})
+        queue.flush()
+        self.assertEqual([[payload['index'] for payload in batch] for batch in batches],
+                         [[0, 1], [2, 3], [4]])
+
+    def test_mutation_returns_a_job_to_poll(self):
+        batches = []
+        with mock.patch('crm.ingest.ingestion_queue', ingest.IngestionQueue(batches.append)):
+            data = graphql(self.client, """mutation {
+                createCustomer(input: {name: "Ann", email: "ann@example.com"}) { jobId customer { id } }
+            }""")
+            ingest.ingestion_queue.flush()
+        job_id = data['createCustomer']['jobId']
+        self.assertIsNone(data['createCustomer']['customer'])
+        self.assertFalse(Customer.objects.filter(email='ann@example.com').exists())
+
+        ingest.process_batch(sum(batches, []))
+        status = graphql(self.client, f'{{ ingestionStatus(jobId: "{job_id}") {{ status customer {{ email }} }} }}')
+        self.assertEqual(status['ingestionStatus'], {'status': 'DONE', 'customer': {'email': 'ann@example.com'}})
+
+
+class RecordingBackend:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, reminder):
+        if reminder.order_id in self.failing:
+            raise ConnectionError('mail server down')
+        with self.lock:
+            self.sent.append(reminder.order_id)
+
+
+class OrderReminderTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='Buyer', email='buyer@example.com')
+        now = timezone.now()
+        self.recent = [
+            Order.objects.create(customer=customer, total_amount=Decimal('10.00'),
+                                 order_date=now - timedelta(days=index)).pk
+            for index in range(5)
+        ]
+        self.old = Order.objects.create(customer=customer, total_amount=Decimal('10.00'),
+                                        order_date=now - timedelta(days=30))
+
+    def dispatch(self, backend, **kwargs):
+        return dispatch_reminders(backend, batch_size=2, workers=2, rate=None, **kwargs)
+
+    def test_recent_orders_get_one_reminder_a_day(self):
+        backend = RecordingBackend()
+        result = self.dispatch(backend)
+        self.assertEqual((result.sent, result.failed, result.batches), (5, 0, 3))
+        self.assertEqual(sorted(backend.sent), self.recent)
+        # A rerun the same day finds nothing left to send
+        self.assertEqual(self.dispatch(backend).sent, 0)
+        self.assertEqual(len(backend.sent), 5)
+        # The next day they are due again
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(self.dispatch(backend, day=tomorrow).sent, 5)
+
+    def test_failed_reminders_are_retried_by_the_next_run(self):
+        with self.assertLogs('crm.reminders', 'WARNING'):
+            result = self.dispatch(RecordingBackend(failing={self.recent[0]}))
+        self.assertEqual((result.sent, result.failed), (4, 1))
+        backend = RecordingBackend()
+        self.assertEqual(self.dispatch(backend).sent, 1)
+        self.assertEqual(backend.sent, [self.recent[0]])
+
+    def test_claims_older_than_the_window_are_pruned(self):
+        ReminderLog.objects.create(order=self.old, date=timezone.localdate() - timedelta(days=30), run='old')
+        self.dispatch(RecordingBackend())
+        self.assertFalse(ReminderLog.objects.filter(run='old').exists())
+
+
+class BatchTests(CRMTestCase):
+    def test_failed_entries_do_not_fail_the_batch(self):
+        batch = [
+            {'query': '{ hello }'},
+            {'query': '{ noSuchField }'},
+            {'query': 'mutation { createCustomer(input: {name: "Ann", email: "ann@example.com"}) { message } }'},
+        ]
+        response = self.client.post('/graphql', json.dumps(batch), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)
+        self.assertEqual([result['status'] for result in results], [200, 400, 200])
+        self.assertEqual(results[0]['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertIn('errors', results[1])
+        self.assertEqual(results[2]['data']['createCustomer']['message'], 'Customer created successfully')
+        self.assertTrue(Customer.objects.filter(email='ann@example.com').exists())
+
+
+@override_settings(ROOT_URLCONF='crm.tests')
+class ReplicaStickinessMiddlewareTests(TestCase):
+    async def test_async_requests_run_concurrently(self):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(self.async_client.get('/slow') for _ in range(10)))
+        self.assertEqual({response.status_code for response in responses}, {200})
+        # Serialised through one thread this would take 2s
+        self.assertLess(time.perf_counter() - started, 1)
+
+    async def test_async_write_sets_sticky_cookie(self):
+        with mock.patch('crm.routers.REPLICAS', ['replica']):
+            response = await self.async_client.get('/write')
+            self.assertIn(COOKIE, response.cookies)
+            response = await self.async_client.get('/slow')
+            self.assertNotIn(COOKIE, response.cookies)
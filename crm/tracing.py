@@ -0,0 +1,227 @@
+"""
+Resolver tracing and SQL instrumentation for ``/graphql``.
+
+While ``CRM_TRACING`` is on, every operation runs inside an
+``OperationTrace``: ``TracingMiddleware`` times each resolver and a
+``connection.execute_wrapper`` counts and times the SQL. Statements are
+grouped by shape (placeholders, ``IN`` lists collapsed); a shape repeated
+more than ``CRM_TRACING_N_PLUS_ONE`` times in one operation is reported as
+an N+1.
+
+Every trace is summarised into ``trace_stats`` (the last
+``CRM_TRACING_WINDOW`` operations, served at ``/graphql/stats``) and the
+``crm.tracing`` logger. Requests sending the ``CRM_TRACING_HEADER`` header
+(honoured for staff users, or everyone when ``DEBUG``) also get the full
+trace in ``extensions.tracing``, in the Apollo tracing format plus ``sql``.
+
+With ``CRM_TRACING = False`` neither the middleware nor the wrapper is
+installed.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('crm.tracing')
+
+ENABLED = getattr(settings, 'CRM_TRACING', True)
+HEADER = getattr(settings, 'CRM_TRACING_HEADER', 'X-CRM-Trace')
+N_PLUS_ONE = getattr(settings, 'CRM_TRACING_N_PLUS_ONE', 5)
+WINDOW = getattr(settings, 'CRM_TRACING_WINDOW', 500)
+SLOW_MS = getattr(settings, 'CRM_TRACING_SLOW_MS', 500)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def sql_shape(sql):
+    """``sql`` with ``IN`` lists of any length written the same way."""
+    return IN_LIST.sub('IN (...)', WHITESPACE.sub(' ', sql.strip()))
+
+
+def wants_trace(request):
+    """Whether ``request`` asked for ``extensions.tracing`` and may see it."""
+    if not request.headers.get(HEADER):
+        return False
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class OperationTrace:
+    def __init__(self, name, verbose=False):
+        self.name = name
+        self.verbose = verbose
+        self.resolvers = []
+        self.fields = {}
+        self.sql_count = 0
+        self.sql_ns = 0
+        self.shapes = Counter()
+        self.started = self.ended = 0
+        self.start_time = self.end_time = None
+
+    def __enter__(self):
+        self.start_time = datetime.now(timezone.utc)
+        self.started = time.perf_counter_ns()
+        self.wrappers = ExitStack()
+        for alias in connections:
+            self.wrappers.enter_context(connections[alias].execute_wrapper(self.record_sql))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrappers.close()
+        self.ended = time.perf_counter_ns()
+        self.end_time = datetime.now(timezone.utc)
+        trace_stats.record(self)
+
+    @property
+    def duration_ms(self):
+        return (self.ended - self.started) / 1e6
+
+    def record_sql(self, execute, sql, params, many, context):
+        started = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ns += time.perf_counter_ns() - started
+            self.sql_count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def record_field(self, info, started, ended):
+        key = f'{info.parent_type.name}.{info.field_name}'
+        count, total = self.fields.get(key, (0, 0))
+        self.fields[key] = (count + 1, total + ended - started)
+        if self.verbose:
+            self.resolvers.append({
+                'path': info.path.as_list(),
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': started - self.started,
+                'duration': ended - started,
+            })
+
+    def n_plus_one(self):
+        return [
+            {'sql': shape, 'count': count}
+            for shape, count in self.shapes.most_common()
+            if count > N_PLUS_ONE
+        ]
+
+    def summary(self):
+        return {
+            'operation': self.name,
+            'duration_ms': round(self.duration_ms, 3),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_ns / 1e6, 3),
+            'n_plus_one': self.n_plus_one(),
+        }
+
+    def extensions(self):
+        return {
+            'version': 1,
+            'startTime': self.start_time.isoformat(),
+            'endTime': self.end_time.isoformat(),
+            'duration': self.ended - self.started,
+            'execution': {'resolvers': self.resolvers},
+            'sql': {
+                'count': self.sql_count,
+                'duration': self.sql_ns,
+                'nPlusOne': self.n_plus_one(),
+            },
+        }
+
+
+class TraceStats:
+    """Rolling summaries of the last ``window`` traced operations."""
+
+    def __init__(self, window=WINDOW):
+        self.traces = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, trace):
+        summary = trace.summary()
+        with self.lock:
+            self.traces.append((summary, trace.fields))
+        if summary['n_plus_one']:
+            logger.warning("N+1 queries in %s: %s", trace.name, summary['n_plus_one'])
+        elif summary['duration_ms'] > SLOW_MS:
+            logger.warning("Slow operation %s: %s", trace.name, summary)
+        else:
+            logger.debug("%s: %s", trace.name, summary)
+
+    def clear(self):
+        with self.lock:
+            self.traces.clear()
+
+    def stats(self, top=20):
+        with self.lock:
+            traces = list(self.traces)
+
+        operations = {}
+        fields = {}
+        n_plus_one = Counter()
+        for summary, trace_fields in traces:
+            operations.setdefault(summary['operation'], []).append(summary)
+            for key, (count, total) in trace_fields.items():
+                calls, duration = fields.get(key, (0, 0))
+                fields[key] = (calls + count, duration + total)
+            for repeated in summary['n_plus_one']:
+                n_plus_one[(summary['operation'], repeated['sql'])] += 1
+
+        return {
+            'window': self.traces.maxlen,
+            'traced': len(traces),
+            'operations': {
+                name: {
+                    'count': len(summaries),
+                    'mean_ms': round(sum(s['duration_ms'] for s in summaries) / len(summaries), 3),
+                    'max_ms': max(s['duration_ms'] for s in summaries),
+                    'mean_sql': round(sum(s['sql_count'] for s in summaries) / len(summaries), 2),
+                    'max_sql': max(s['sql_count'] for s in summaries),
+                }
+                for name, summaries in operations.items()
+            },
+            'slowest_fields': [
+                {'field': key, 'calls': calls, 'total_ms': round(duration / 1e6, 3)}
+                for key, (calls, duration) in sorted(
+                    fields.items(), key=lambda item: item[1][1], reverse=True
+                )[:top]
+            ],
+            'n_plus_one': [
+                {'operation': operation, 'sql': sql, 'operations': count}
+                for (operation, sql), count in n_plus_one.most_common(top)
+            ],
+        }
+
+
+trace_stats = TraceStats()
+
+
+class TracingMiddleware:
+    """Time resolvers of operations traced through ``info.context.crm_tracer``."""
+
+    def resolve(self, next, root, info, **args):
+        tracer = getattr(info.context, 'crm_tracer', None)
+        if tracer is None:
+            return next(root, info, **args)
+        started = time.perf_counter_ns()
+        try:
+            return next(root, info, **args)
+        finally:
+            tracer.record_field(info, started, time.perf_counter_ns())
+
+
+def operation_label(operation_ast, operation_name=None):
+    if operation_ast is None:
+        return operation_name or 'anonymous'
+    name = operation_ast.name.value if operation_ast.name else operation_name or 'anonymous'
+    return f'{operation_ast.operation.value} {name}'
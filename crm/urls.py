@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from .views import AsyncCRMGraphQLView, CRMGraphQLView, export_view, graphql_stats
+
+# crm/asgi.py serves the async view, crm/wsgi.py the synchronous one
+GraphQLViewClass = AsyncCRMGraphQLView if settings.CRM_ASYNC_GRAPHQL else CRMGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql', csrf_exempt(GraphQLViewClass.as_view(graphiql=True))),
+    path('graphql/stats', graphql_stats),
+    path('export/<str:kind>.<str:fmt>', export_view),
 ]
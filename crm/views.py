@@ -0,0 +1,319 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.http import (
+    Http404, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse,
+)
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+
+from .cost import MAX_COST, CostMiddleware, QueryCostError, check_cost, validation_rules
+from . import ingest
+from .export import EXPORTS, FORMATS, export
+from .loaders import clear_loaders
+from .persisted import document_cache
+from .response_cache import response_cache
+from .routers import pin_primary
+from .tracing import ENABLED as TRACING_ENABLED
+from .tracing import OperationTrace, TracingMiddleware, operation_label, trace_stats, wants_trace
+
+
+def get_persisted_hash(request, data):
+    """Return ``extensions.persistedQuery.sha256Hash`` from a GET or POST request."""
+    extensions = request.GET.get('extensions') or data.get('extensions')
+    if not extensions:
+        return None
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+    persisted = extensions.get('persistedQuery') or {}
+    return persisted.get('sha256Hash')
+
+
+# Operations accepted in one JSON array POST
+MAX_BATCH_SIZE = getattr(settings, 'CRM_GRAPHQL_MAX_BATCH_SIZE', 20)
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView that resolves documents through the persisted query cache.
+
+    A JSON array of operations is executed in order in one request and
+    answered with an array of results. The operations share the request as
+    their context, and so the per-request loaders, until a mutation runs.
+    """
+
+    document_cache = document_cache
+    response_cache = response_cache
+    validation_rules = validation_rules()
+    max_cost = MAX_COST
+    cost_middleware = CostMiddleware()
+    max_batch_size = MAX_BATCH_SIZE
+    tracing = TRACING_ENABLED
+    tracing_middleware = TracingMiddleware()
+
+    def get_middleware(self, request):
+        middleware = [*(self.middleware or ()), self.cost_middleware]
+        if self.tracing:
+            middleware.append(self.tracing_middleware)
+        return middleware
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == "application/json":
+            try:
+                data = json.loads(request.body.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+            if isinstance(data, list):
+                if not data:
+                    raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+                if len(data) > self.max_batch_size:
+                    raise HttpError(HttpResponseBadRequest(
+                        f"Batch of {len(data)} operations exceeds the maximum of {self.max_batch_size}."
+                    ))
+                if not all(isinstance(entry, dict) for entry in data):
+                    raise HttpError(HttpResponseBadRequest("Batch entries must be JSON queries."))
+                return data
+        return super().parse_body(request)
+
+    def get_response(self, request, data, show_graphiql=False):
+        if isinstance(data, list):
+            # One failed entry must not fail the others: each result
+            # carries its own status
+            responses = [self.get_single_response(request, entry, batched=True) for entry in data]
+            return "[{}]".format(",".join(response[0] for response in responses)), 200
+        return self.get_single_response(request, data, show_graphiql)
+
+    def get_single_response(self, request, data, show_graphiql=False, batched=False):
+        """``GraphQLView.get_response`` that also returns ``extensions``."""
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        # Set by failed form/serializer mutations; only this entry's count
+        setattr(request, MUTATION_ERRORS_FLAG, False)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch or batched:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        sha256_hash = get_persisted_hash(request, data)
+        if not query and not sha256_hash:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = self.document_cache.get_document(
+                schema, query, sha256_hash, self.validation_rules
+            )
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        try:
+            estimated_cost = check_cost(schema, document, operation_name, variables, self.max_cost)
+        except QueryCostError as e:
+            return ExecutionResult(errors=[e])
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+            context = execute_options["context_value"]
+            context.crm_cost = 0
+            context.crm_tracer = None
+            if self.tracing:
+                context.crm_tracer = OperationTrace(
+                    operation_label(operation_ast, operation_name), verbose=wants_trace(request)
+                )
+
+            with context.crm_tracer or nullcontext():
+                result = self.execute_operation(
+                    request, schema, document, operation_ast, operation_name, variables, execute_options
+                )
+            result = self.with_cost(result, estimated_cost, context.crm_cost)
+            if context.crm_tracer is not None and context.crm_tracer.verbose:
+                result.extensions['tracing'] = context.crm_tracer.extensions()
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def execute_operation(
+        self, request, schema, document, operation_ast, operation_name, variables, execute_options
+    ):
+        context = execute_options["context_value"]
+        is_mutation = (
+            operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+        )
+        if is_mutation:
+            # Mutations read what they validate against from the primary,
+            # and so does the rest of the request
+            pin_primary()
+        if is_mutation and (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(schema, document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            clear_loaders(context)
+            return result
+
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.key_for(schema, document, operation_name, variables)
+            if cache_key is not None:
+                data = self.response_cache.get(cache_key)
+                if data is not None:
+                    return ExecutionResult(data=data)
+
+        result = execute(schema, document, **execute_options)
+        if cache_key is not None and not result.errors:
+            self.response_cache.set(cache_key, result.data)
+        if is_mutation:
+            clear_loaders(context)
+        return result
+
+    def with_cost(self, result, estimated, actual):
+        extensions = dict(result.extensions or {})
+        extensions['cost'] = {'estimated': estimated, 'actual': actual, 'maximum': self.max_cost}
+        result.extensions = extensions
+        return result
+
+
+# Threads (and so database connections) serving AsyncCRMGraphQLView
+ASYNC_WORKERS = getattr(settings, 'CRM_ASYNC_WORKERS', 16)
+
+graphql_executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix='crm-graphql')
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """CRMGraphQLView for ASGI servers.
+
+    The resolvers, loaders and optimizer use the synchronous ORM, so each
+    request executes in ``graphql_executor`` instead of on the event loop.
+    The loop keeps accepting and queueing requests while at most
+    ``CRM_ASYNC_WORKERS`` execute, and slow clients never hold a thread.
+    """
+
+    view_is_async = True
+    executor = graphql_executor
+
+    async def dispatch(self, request, *args, **kwargs):
+        return await sync_to_async(
+            self.dispatch_in_pool, thread_sensitive=False, executor=self.executor
+        )(request, *args, **kwargs)
+
+    def dispatch_in_pool(self, request, *args, **kwargs):
+        # Pool threads outlive requests: apply CONN_MAX_AGE as a request would
+        close_old_connections()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+@require_GET
+@staff_member_required
+def graphql_stats(request):
+    """Counters for sizing the GraphQL caches and the ingestion queue."""
+    return JsonResponse({
+        'documents': document_cache.stats(),
+        'responses': response_cache.stats() if response_cache is not None else None,
+        'tracing': trace_stats.stats() if TRACING_ENABLED else None,
+        'ingestion': ingest.ingestion_queue.stats() if ingest.ingestion_queue is not None else None,
+    })
+
+
+@require_GET
+@staff_member_required
+def export_view(request, kind, fmt):
+    """Stream ``kind`` rows as ``fmt``, filtered by the query string."""
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise Http404(f"No export {kind}.{fmt}")
+    try:
+        rows = export(kind, fmt, request.GET)
+    except ValidationError as e:
+        return HttpResponseBadRequest(e.messages[0], content_type='application/json')
+    response = StreamingHttpResponse(rows, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response